@@ -2,10 +2,15 @@ from Data import Data
 from DrydownModel import DrydownModel
 from EventSeparator import EventSeparator
 from SMAPgrid import SMAPgrid
+from FitCache import FitCache
+from ragged import read_results, write_results
 import warnings
 from datetime import datetime
 import os
 import getpass
+from configparser import ConfigParser
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import logging
 from MyLogger import getLogger
@@ -31,6 +36,46 @@ def create_output_dir(parent_dir):
     return output_dir
 
 
+def summarize_fit_diagnostics(df):
+    """Aggregate the fit diagnostics per pixel and model
+
+    Args:
+        df (pd.DataFrame): fit diagnostics of all the events, one row per event and model
+
+    Returns:
+        pd.DataFrame: number of fits and failures, fit time, and number of function evaluations per pixel and model
+    """
+    df = df.assign(is_failed=df["failure"].fillna("") != "")
+    df_summary = (
+        df.groupby(["EASE_row_index", "EASE_column_index", "model"])
+        .agg(
+            n_events=("is_failed", "size"),
+            n_failed=("is_failed", "sum"),
+            total_fit_time=("wall_time", "sum"),
+            median_fit_time=("wall_time", "median"),
+            median_nfev=("nfev", "median"),
+        )
+        .reset_index()
+    )
+    df_summary["failure_rate"] = df_summary["n_failed"] / df_summary["n_events"]
+    return df_summary.sort_values("total_fit_time", ascending=False)
+
+
+@lru_cache(maxsize=1)
+def read_previous_results(filepath):
+    """Read the results of a previous run, split by pixel. Cached, so that each worker process reads the file only once
+
+    Args:
+        filepath (str): path to all_results.csv of the previous run
+
+    Returns:
+        dict: dataframe of the events for each (EASE_row_index, EASE_column_index)
+    """
+    df = read_results(filepath, index_col=0)
+    df["event_start"] = pd.to_datetime(df["event_start"])
+    return dict(tuple(df.groupby(["EASE_row_index", "EASE_column_index"])))
+
+
 class Agent:
     def __init__(self, cfg=None, logger=None):
         self.cfg = cfg
@@ -39,6 +84,102 @@ class Agent:
         self.target_EASE_idx = self.smapgrid.get_EASE_index_subset()
         self.verbose = cfg["MODEL"]["verbose"].lower() in ["true", "yes", "1"]
         self.output_dir = create_output_dir(parent_dir=cfg["PATHS"]["output_dir"])
+        self.incremental = self.is_incremental()
+
+    def is_incremental(self):
+        """Check whether the previous run can be extended with the newly added days, rather than rerunning the whole period"""
+        if not self.cfg.getboolean("INCREMENTAL", "incremental", fallback=False):
+            return False
+
+        previous_output_dir = self.cfg.get("INCREMENTAL", "previous_output_dir")
+        self.previous_results_file = os.path.join(previous_output_dir, "all_results.csv")
+        cfg_previous = ConfigParser()
+        if not cfg_previous.read(os.path.join(previous_output_dir, "config.ini")):
+            log.warning(
+                f"No readable config.ini in {previous_output_dir}: running the whole period"
+            )
+            return False
+        if not os.path.exists(self.previous_results_file):
+            log.warning(
+                f"No all_results.csv in {previous_output_dir}: running the whole period"
+            )
+            return False
+
+        # The previous run must have used the same models and parameters, and the same start date
+        for section in ["MODEL_PARAMS"]:
+            if not cfg_previous.has_section(section) or dict(
+                cfg_previous[section]
+            ) != dict(self.cfg[section]):
+                log.warning(
+                    f"[{section}] differs from the previous run: running the whole period"
+                )
+                return False
+        for option in [
+            "force_PET",
+            "use_rainfall",
+            "sm_cutoff_method",
+            "tau_exp_model",
+            "exp_model",
+            "q_model",
+            "sigmoid_model",
+            "is_stage1ET_active",
+        ]:
+            if cfg_previous.get("MODEL", option, fallback=None) != self.cfg.get(
+                "MODEL", option
+            ):
+                log.warning(
+                    f"{option} differs from the previous run: running the whole period"
+                )
+                return False
+        if cfg_previous.get("EXTENT", "start_date", fallback=None) != self.cfg.get(
+            "EXTENT", "start_date"
+        ):
+            log.warning("start_date differs from the previous run: running the whole period")
+            return False
+        if not cfg_previous.has_option("EXTENT", "end_date"):
+            log.warning("No end_date in the previous config: running the whole period")
+            return False
+
+        self.previous_end_date = pd.to_datetime(cfg_previous.get("EXTENT", "end_date"))
+        log.info(
+            f"Incremental mode: events after {self.previous_end_date:%Y-%m-%d} are added to {self.previous_results_file}"
+        )
+        return True
+
+    def get_previous_events(self, data, separator):
+        """Get the events of the previous run that cannot be changed by the newly added days
+
+        Args:
+            data (Data): datarods of the pixel
+            separator (EventSeparator): event separator of the pixel
+
+        Returns:
+            tuple: previous results to keep, and the date from which the events need to be separated again.
+                   (None, None) if the whole period needs to be processed.
+        """
+        if not self.incremental:
+            return None, None
+
+        previous_results = read_previous_results(self.previous_results_file)
+        df_previous = previous_results.get(
+            (data.EASE_row_index, data.EASE_column_index)
+        )
+        if df_previous is None:
+            return None, None
+
+        # The event separation and the fits depend on the soil moisture range of the pixel.
+        # If the new days extended the range, all the events may change
+        if not (
+            np.isclose(df_previous["min_sm"].iloc[0], data.min_sm)
+            and np.isclose(df_previous["max_sm"].iloc[0], data.max_sm)
+        ):
+            return None, None
+
+        # Events starting earlier than this ended before the previous end date, whatever happens afterwards
+        restart_date = self.previous_end_date - pd.Timedelta(
+            days=separator.max_drydown_days + separator.max_look_ahead_days
+        )
+        return df_previous[df_previous["event_start"] < restart_date], restart_date
 
     def initialize(self):
         None
@@ -48,6 +189,9 @@ class Agent:
 
         Args:
             sample_EASE_index (list.shape[1,2]): a pair of EASE index, representing [0,0] the EASE row index (y, or latitude) and [0,1] EASE column index (x, or longitude)
+
+        Returns:
+            tuple: dataframes of the fitted events and of the fit diagnostics of all events, or None if the pixel is skipped
         """
 
         try:
@@ -72,11 +216,18 @@ class Agent:
             # _______________________________________________________________________________________________
             # Run the stormevent separation
             separator = EventSeparator(self.cfg, data)
-            events = separator.separate_events(output_dir=self.output_dir)
+
+            # In incremental mode, reuse the previous results and only separate the events that the new days can affect
+            df_previous, restart_date = self.get_previous_events(data, separator)
+            events = separator.separate_events(
+                output_dir=self.output_dir, restart_date=restart_date
+            )
 
             # If there is no drydown event detected for the pixel, skip the analysis
             # Check if there is SM data
             if not events:
+                if df_previous is not None and not df_previous.empty:
+                    return df_previous, pd.DataFrame()
                 log.warning(f"No event drydown was detected at {sample_EASE_index}")
                 return None
 
@@ -90,12 +241,19 @@ class Agent:
             drydown_model.fit_models(output_dir=self.output_dir)
 
             results_df = drydown_model.return_result_df()
+            diagnostics_df = drydown_model.return_diagnostics_df()
 
             log.info(
                 f"Drydown model analysis completed at {sample_EASE_index}: {len(results_df)}/{len(events)} events fitted"
             )
 
-            return results_df
+            if df_previous is not None:
+                log.info(
+                    f"Incremental update at {sample_EASE_index}: {len(df_previous)} events reused from the previous run"
+                )
+                results_df = pd.concat([df_previous, results_df], ignore_index=True)
+
+            return results_df, diagnostics_df
 
         except Exception as e:
             print(f"Error in thread: {sample_EASE_index}")
@@ -105,24 +263,50 @@ class Agent:
         """Finalize the analysis from all the pixels
 
         Args:
-            results (list): concatinated results returned from serial/multi-threadding analysis
+            results (list): (results, fit diagnostics) pairs returned from serial/multi-threadding analysis
         """
-        self.save_to_csv(results)
+        self.save_to_csv([result[0] for result in results])
+        # The config is what the next incremental run checks against, so it is saved before the diagnostics report
         self.save_config()
+        self.save_fit_diagnostics([result[1] for result in results])
+
+        # Keep the fit cache within its size limit
+        if self.cfg.getboolean("CACHE", "use_cache", fallback=False):
+            FitCache(self.cfg).evict()
+
         # self.smapgrid.remap_results(df_results)
         # self.smapgrid.plot_remapped_results(da)
 
     def save_to_csv(self, results):
-        if len(results) > 1:
-            try:
-                df = pd.concat(results)
-            except:
-                df = results
-        else:
-            df = results
-        df.to_csv(os.path.join(self.output_dir, "all_results.csv"))
+        df = pd.concat(results)
+        write_results(df, os.path.join(self.output_dir, "all_results.csv"))
         return df
 
+    def save_fit_diagnostics(self, diagnostics):
+        """Save the fit diagnostics of all the events, and a report of the pixel/model combinations that are the slowest and fail the most"""
+        df = pd.concat(diagnostics, ignore_index=True)
+        df.to_csv(os.path.join(self.output_dir, "fit_diagnostics.csv"), index=False)
+
+        # No model was fitted in this run (e.g., an incremental run without new events)
+        if df.empty:
+            log.info("No model fits in this run: no fit diagnostics summary")
+            return None
+
+        df_summary = summarize_fit_diagnostics(df)
+        df_summary.to_csv(
+            os.path.join(self.output_dir, "fit_diagnostics_summary.csv"), index=False
+        )
+
+        log.info(
+            "Slowest pixel/model combinations:\n"
+            + df_summary.nlargest(10, "total_fit_time").to_string(index=False)
+        )
+        log.info(
+            "Most-failing pixel/model combinations:\n"
+            + df_summary.nlargest(10, "n_failed").to_string(index=False)
+        )
+        return df_summary
+
     def save_config(self):
         with open(os.path.join(self.output_dir, "config.ini"), "w") as cfg_file:
             self.cfg.write(cfg_file)
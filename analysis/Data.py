@@ -5,6 +5,7 @@ from datetime import datetime
 import os
 import warnings
 from MyLogger import getLogger
+from datarods import get_soil_moisture, get_pet, get_precipitation
 
 __author__ = "Ryoko Araki"
 __contact__ = "raraki@ucsb.edu"
@@ -17,18 +18,6 @@ __url__ = ""
 log = getLogger(__name__)
 
 
-def get_filename(varname, EASE_row_index, EASE_column_index):
-    """Get the filename of the datarod"""
-    filename = f"{varname}_{EASE_row_index:03d}_{EASE_column_index:03d}.csv"
-    return filename
-
-
-def set_time_index(df, index_name="time"):
-    """Set the datetime index to the pandas dataframe"""
-    df[index_name] = pd.to_datetime(df[index_name])
-    return df.set_index("time")
-
-
 class Data:
     """Class that handles datarods (Precipitation, SM, PET data) for a EASE pixel"""
 
@@ -80,60 +69,19 @@ class Data:
 
         return df
 
-    def get_dataframe(self, varname):
-        """Get the pandas dataframe for a datarod of interest
-
-        Args:
-            varname (string): name of the variable: "SPL3SMP", "PET", "SPL4SMGP"
-
-        Returns:
-            dataframe: Return dataframe with datetime index, cropped for the timeperiod for a variable
-        """
-
-        fn = get_filename(
-            varname,
-            EASE_row_index=self.EASE_row_index,
-            EASE_column_index=self.EASE_column_index,
-        )
-        _df = pd.read_csv(os.path.join(self.data_dir, self.datarods_dir, varname, fn))
-
-        # Set time index and crop
-        _df = set_time_index(_df, index_name="time")
-        return _df[self.start_date : self.end_date]
-
     def get_soil_moisture(self, varname="SPL3SMP"):
         """Get a datarod of soil moisture data for a pixel"""
 
-        # Get variable dataframe
-        _df = self.get_dataframe(varname=varname)
-
-        # Use retrieval flag to quality control the data
-        condition_bad_data_am = (
-            _df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 0.0
-        ) & (_df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 8.0)
-        condition_bad_data_pm = (
-            _df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 0.0
-        ) & (_df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 8.0)
-        _df.loc[
-            condition_bad_data_am, "Soil_Moisture_Retrieval_Data_AM_soil_moisture"
-        ] = np.nan
-        _df.loc[
-            condition_bad_data_pm, "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm"
-        ] = np.nan
-
-        # If there is two different versions of 2015-03-31 data --- remove this
-        df = _df.loc[~_df.index.duplicated(keep="first")]
-
-        # Resample to regular time interval
-        df = df.resample("D").asfreq()
-
-        # Merge the AM and PM soil moisture data into one daily timeseries of data
-        df["sm"] = df[
-            [
-                "Soil_Moisture_Retrieval_Data_AM_soil_moisture",
-                "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm",
-            ]
-        ].mean(axis=1, skipna=True)
+        # QC'd daily soil moisture, read by the reader shared with the notebooks
+        df = get_soil_moisture(
+            self.data_dir,
+            self.datarods_dir,
+            self.EASE_row_index,
+            self.EASE_column_index,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            varname=varname,
+        )
 
         # Get max and min values
         self.min_sm = df.sm.min(skipna=True)
@@ -158,15 +106,15 @@ class Data:
 
     def get_pet(self, varname="PET"):
         """Get a datarod of PET data for a pixel"""
-
-        # Get variable dataframe
-        _df = self.get_dataframe(varname=varname)
-
-        # Drop unnccesary dimension
-        _df = _df.drop(columns=["x", "y"])
-
-        # Resample to regular time intervals
-        return _df.resample("D").asfreq()
+        return get_pet(
+            self.data_dir,
+            self.datarods_dir,
+            self.EASE_row_index,
+            self.EASE_column_index,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            varname=varname,
+        )
 
     def get_anc_params(self):
         """Get a datarod of PET data for a pixel"""
@@ -190,21 +138,16 @@ class Data:
 
     def get_precipitation(self, varname="SPL4SMGP"):
         """Get a datarod of precipitation data for a pixel"""
-
-        # Get variable dataframe
-        _df = self.get_dataframe(varname=varname)
-
-        # Drop unnccesary dimension and change variable name
-        _df = _df.drop(columns=["x", "y"]).rename(
-            {"precipitation_total_surface_flux": "precip"}, axis="columns"
+        return get_precipitation(
+            self.data_dir,
+            self.datarods_dir,
+            self.EASE_row_index,
+            self.EASE_column_index,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            varname=varname,
         )
 
-        # Convert precipitation from kg/m2/s to mm/day -> 1 kg/m2/s = 86400 mm/day
-        _df.precip = _df.precip * 86400
-
-        # Resample to regular time interval
-        return _df.resample("D").asfreq()
-
     def calc_dSdt(self, df):
         """Calculate d(Soil Moisture)/dt"""
 
@@ -3,7 +3,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 from MyLogger import getLogger
+from FitCache import FitCache
+from criteria import calc_large_q_criteria
 import threading
+import time
 from scipy.integrate import solve_ivp
 from scipy.optimize import curve_fit, minimize
 from scipy.stats import t
@@ -99,6 +102,23 @@ def q_model(t, q, ETmax, theta_0, theta_star, theta_w, z=50.0, t_star=0.0):
 
 
 def q_model_piecewise(t, q, ETmax, theta_0, theta_star, theta_w, z=50.0):
+    """
+    Calculate the drydown curve assuming that both Stage I (ETmax-limited, linear) and Stage II (q model) are happening.
+    The Stage II curve is also evaluated on the Stage I timesteps, where its base can be negative (q > 1), and then discarded by np.where;
+    the invalid-power warnings of those timesteps are silenced.
+
+    Parameters:
+        t (int): Timestep, in day.
+        q (float): Degree of non-linearity in the soil moisture response.
+        ETmax (float): Maximum evapotranpisration rate in mm/day.
+        theta_0 (float): The initial soil moisture after precipitation, in m3/m3
+        theta_star (float): Critical soil moisture content, equal to s_star * porosity, in m3/m3
+        theta_w (float): Wilting point soil moisture content, equal to s_star * porosity, in m3/m3
+        z (float): Soil thicness in mm. Default is 50 mm
+
+    Returns:
+        float: Soil moisture content for the given timestep, in m3/m3.
+    """
 
     k = (
         ETmax / z
@@ -106,13 +126,14 @@ def q_model_piecewise(t, q, ETmax, theta_0, theta_star, theta_w, z=50.0):
 
     t_star = (theta_0 - theta_star) / k  # Time it takes from theta_0 to theta_star
 
-    return np.where(
-        t_star > t,
-        -k * t + theta_0,
-        q_model(
-            t, q, ETmax, theta_0, theta_star, theta_w, t_star=np.maximum(t_star, 0)
-        ),
-    )
+    with np.errstate(invalid="ignore"):
+        return np.where(
+            t_star > t,
+            -k * t + theta_0,
+            q_model(
+                t, q, ETmax, theta_0, theta_star, theta_w, t_star=np.maximum(t_star, 0)
+            ),
+        )
 
 
 def exp_model_piecewise(t, ETmax, theta_0, theta_star, theta_w, z=50.0):
@@ -195,6 +216,62 @@ def objective_function(parameters, y_obs, y_init, t_obs):
     return np.sum(error**2)
 
 
+class FitFailure(Exception):
+    """Failure of a model fit detected by the fitting code itself, with its failure reason code"""
+
+    def __init__(self, reason, message=""):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+def check_fit_inputs(model, x, p0, bounds):
+    """Check the inputs that curve_fit would reject, before calling it
+
+    Raises:
+        FitFailure: "infeasible_bounds" if a lower bound is not below its upper bound or p0 is out of the bounds,
+            "nonfinite_residuals" if the model is not finite at p0
+    """
+    p0 = np.asarray(p0, dtype=float)
+    lower, upper = (np.broadcast_to(np.asarray(bound, dtype=float), p0.shape) for bound in bounds)
+    if not np.all(lower < upper) or not np.all((lower <= p0) & (p0 <= upper)):
+        raise FitFailure("infeasible_bounds", f"p0={p0} is not within the bounds {lower}, {upper}")
+    with np.errstate(all="ignore"):
+        y0 = model(x, *p0)
+    if not np.all(np.isfinite(y0)):
+        raise FitFailure("nonfinite_residuals", f"the model is not finite at p0={p0}")
+
+
+def get_failure_reason(e):
+    """Classify the exception raised while fitting a model into a short failure reason code
+
+    The reason is taken from the FitFailure raised by the fitting code where possible. The messages of scipy are only matched as
+    a last resort, for the errors the checks do not anticipate; they are pinned to the installed scipy by tests/test_failure_reason.py
+
+    Args:
+        e (Exception): exception raised during the fit
+
+    Returns:
+        str: failure reason code
+    """
+    if isinstance(e, FitFailure):
+        return e.reason
+    if isinstance(e, IndexError):
+        return "insufficient_data"
+
+    message = str(e)
+    if isinstance(e, RuntimeError) and "Optimal parameters not found" in message:
+        return "not_converged"
+    if isinstance(e, ValueError) and (
+        "lower bound" in message
+        or "outside of provided bounds" in message
+        or "infeasible" in message
+    ):
+        return "infeasible_bounds"
+    if isinstance(e, ValueError) and "not finite" in message:
+        return "nonfinite_residuals"
+    return "other"
+
+
 class DrydownModel:
     def __init__(self, cfg, Data, Events):
 
@@ -218,6 +295,13 @@ class DrydownModel:
         self.z = self.cfg.getfloat("MODEL_PARAMS", "z")
         self.target_rmsd = self.cfg.getfloat("MODEL_PARAMS", "target_rmsd")
 
+        # ______________________________________________________________________
+        # Cache of the event-level fits
+        if cfg.getboolean("CACHE", "use_cache", fallback=False):
+            self.cache = FitCache(cfg)
+        else:
+            self.cache = None
+
         # ______________________________________________________________________
         # Set normalization factor
         self.norm_max = self.data.max_cutoff_sm
@@ -238,7 +322,12 @@ class DrydownModel:
         """Loop through the list of events, fit the drydown models, and update the Event intances' attributes"""
         self.output_dir = output_dir
 
+        # Get the parameter bounds of all the events, and skip the ones that cannot be fitted
+        self.event_bounds = self.calc_event_bounds()
+
         for i, event in enumerate(self.events):
+            if not self.is_feasible(event):
+                continue
             try:
                 updated_event = self.fit_one_event(event)
                 # Replace the old Event instance with updated one
@@ -250,6 +339,107 @@ class DrydownModel:
         if self.plot_results:
             self.plot_drydown_models_in_timesreies()
 
+    def calc_event_bounds(self):
+        """Calculate the parameter bounds of the tau_exp, exp and q models for all the events of the pixel at once,
+        and flag the events whose bounds are infeasible with a failure reason code, so they never reach the optimizer
+
+        Returns:
+            pd.DataFrame: bounds, initial values and failure reason codes (empty if feasible) of each model, indexed by event index
+        """
+        # Gather the first and second observations of all events from one flat array
+        n_obs = np.array([len(event.y) for event in self.events])
+        offsets = np.cumsum(n_obs) - n_obs
+        y_all = np.concatenate([event.y for event in self.events] + [[np.nan, np.nan]])
+        first_non_nan = np.where(n_obs >= 1, y_all[offsets], np.nan)
+        second_non_nan = np.where(n_obs >= 2, y_all[offsets + 1], np.nan)
+
+        pet = np.array([event.pet for event in self.events], dtype=float)
+        subset_sm_range = np.array([event.subset_sm_range for event in self.events])
+        subset_min_sm = np.array([event.subset_min_sm for event in self.events])
+        est_theta_fc = np.array([event.est_theta_fc for event in self.events], dtype=float)
+        est_theta_star = np.array(
+            [event.est_theta_star for event in self.events], dtype=float
+        )
+
+        df = pd.DataFrame(index=[event.index for event in self.events])
+
+        ### tau_exp: Delta_theta and Theta_w ###
+        df["min_delta_theta"] = 0
+        df["max_delta_theta"] = self.data.max_sm - self.data.min_sm
+        df["ini_delta_theta"] = subset_sm_range
+        df["min_theta_w"] = self.data.min_sm
+        df["max_theta_w"] = subset_min_sm
+        df["ini_theta_w"] = (df["min_theta_w"] + df["max_theta_w"]) / 2
+
+        ### ETmax ###
+        if self.force_PET:
+            df["max_ETmax"] = pet
+            df["min_ETmax"] = pet * 0.2
+        else:
+            df["max_ETmax"] = np.inf
+            df["min_ETmax"] = 0
+        df["ini_ETmax"] = df["max_ETmax"] * 0.5
+
+        ### theta_0 ###
+        df["min_theta_0"] = first_non_nan - self.target_rmsd
+        df["max_theta_0"] = np.minimum(
+            first_non_nan + self.target_rmsd, self.data.max_cutoff_sm
+        )
+        df["ini_theta_0"] = first_non_nan
+
+        ### theta_star ###
+        df["max_theta_star"] = np.where(
+            np.isnan(est_theta_fc), self.data.max_cutoff_sm, est_theta_fc
+        )
+        df["min_theta_star"] = np.where(
+            np.isnan(est_theta_star),
+            second_non_nan,
+            np.maximum(est_theta_star, second_non_nan),
+        )
+        df["ini_theta_star"] = (df["max_theta_star"] + df["min_theta_star"]) / 2
+
+        # ______________________________________________________________________________________
+        # Flag the infeasible events (NaN bounds compare as infeasible)
+        def get_failure(is_feasible):
+            return np.where(
+                n_obs < 2,
+                "insufficient_data",
+                np.where(is_feasible, "", "infeasible_bounds"),
+            )
+
+        df["tau_exp_failure"] = get_failure(
+            (df["max_delta_theta"] > df["min_delta_theta"])
+            & (df["max_theta_w"] > df["min_theta_w"])
+        )
+
+        is_feasible = (
+            (df["max_ETmax"] > df["min_ETmax"])
+            & np.isfinite(df["ini_ETmax"])
+            & (df["max_theta_0"] > df["min_theta_0"])
+            & (df["ini_theta_0"] <= df["max_theta_0"])
+        )
+        if self.is_stage1ET_active:
+            is_feasible &= df["max_theta_star"] > df["min_theta_star"]
+        df["exp_failure"] = get_failure(is_feasible)
+        df["q_failure"] = get_failure(is_feasible)
+
+        return df
+
+    def is_feasible(self, event):
+        """Check whether all the models to run can be fitted to the event, and record the failure diagnostics otherwise"""
+        models_to_check = {
+            "tau_exp": self.run_tau_exp_model,
+            "exp": self.run_exp_model,
+            "q": self.run_q_model,
+        }
+        is_feasible = True
+        for model_type, run_model in models_to_check.items():
+            failure = self.event_bounds.at[event.index, f"{model_type}_failure"]
+            if run_model and failure:
+                event.add_diagnostics(model_type, failure=failure)
+                is_feasible = False
+        return is_feasible
+
     def fit_one_event(self, event):
         """Fit multiple drydown models for one event
 
@@ -272,7 +462,7 @@ class DrydownModel:
                     "tau_exp", popt, pcov, y_opt, r_squared, aic, aicc, bic, ss_res, ss_tot
                 )
             except Exception as e:
-                log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+                self.record_failure(event, "tau_exp", e)
                 return None
 
         # _____________________________________________
@@ -305,7 +495,7 @@ class DrydownModel:
                     est_theta_w,
                 )
             except Exception as e:
-                log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+                self.record_failure(event, "exp", e)
                 return None
 
         # _____________________________________________
@@ -338,7 +528,7 @@ class DrydownModel:
                     est_theta_w,
                 )
             except Exception as e:
-                log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+                self.record_failure(event, "q", e)
                 return None
 
         # _____________________________________________
@@ -348,7 +538,7 @@ class DrydownModel:
                 popt, r_squared, y_opt = self.fit_sigmoid_model(event)
                 event.add_attributes("sgm", popt, r_squared, y_opt)
             except Exception as e:
-                log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+                self.record_failure(event, "sgm", e)
                 return None
         # _____________________________________________
         # Finalize results for one event
@@ -357,7 +547,15 @@ class DrydownModel:
 
         return event
 
-    def fit_model(self, event, model, bounds, p0, param_names):
+    def record_failure(self, event, model_type, e, wall_time=np.nan):
+        """Record the failure of a model fit in the event diagnostics, unless it has already been recorded"""
+        log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+        if model_type not in event.diagnostics:
+            event.add_diagnostics(
+                model_type, wall_time=wall_time, failure=get_failure_reason(e)
+            )
+
+    def fit_model(self, event, model, bounds, p0, param_names, model_type):
         """Base function for fitting models
 
         Args:
@@ -365,18 +563,55 @@ class DrydownModel:
             model (_type_): _description_
             bounds (_type_): _description_
             p0 (_type_): _description_
-            norm (bool, optional): _description_. Defaults to False.
+            param_names (list): names of the parameters to fit
+            model_type (str): name of the model, used as the key of the fit diagnostics
 
         Returns:
             _type_: _description_
         """
+        start = time.perf_counter()
+
+        # Reuse the fit from the cache if the same event has been fitted with the same model and config
+        if self.cache is not None:
+            cache_key = self.cache.get_key(
+                model_type,
+                event.x,
+                event.y,
+                bounds,
+                p0,
+                (self.z, self.norm_min, self.norm_max, self.is_stage1ET_active),
+            )
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                event.add_diagnostics(
+                    model_type,
+                    nfev=entry["nfev"],
+                    status=entry["status"],
+                    wall_time=time.perf_counter() - start,
+                    failure=entry["failure"],
+                    cached=True,
+                )
+                return entry["result"]
+
         try:
             y_fit = event.y
+            check_fit_inputs(model, event.x, p0, bounds)
 
-            # Fit the model
-            popt, pcov = curve_fit(
-                f=model, xdata=event.x, ydata=y_fit, p0=p0, bounds=bounds
-            )
+            # Fit the model; curve_fit raises RuntimeError only when the optimizer stops without converging
+            try:
+                popt, pcov, infodict, mesg, ier = curve_fit(
+                    f=model,
+                    xdata=event.x,
+                    ydata=y_fit,
+                    p0=p0,
+                    bounds=bounds,
+                    full_output=True,
+                )
+            except RuntimeError as e:
+                raise FitFailure("not_converged", str(e)) from e
+            if ier not in [1, 2, 3, 4]:
+                raise FitFailure("not_converged", mesg)
+            wall_time = time.perf_counter() - start
 
             # Get the optimal fit
             y_opt = model(event.x, *popt)
@@ -390,10 +625,47 @@ class DrydownModel:
                 param_names=param_names,
             )
 
-            return popt, pcov, y_opt, r_squared, aic, aicc, bic, ss_res, ss_tot, p_value
+            result = (
+                popt,
+                pcov,
+                y_opt,
+                r_squared,
+                aic,
+                aicc,
+                bic,
+                ss_res,
+                ss_tot,
+                p_value,
+            )
+            event.add_diagnostics(
+                model_type, nfev=infodict["nfev"], status=ier, wall_time=wall_time
+            )
+            if self.cache is not None:
+                self.cache.put(
+                    cache_key,
+                    {
+                        "result": result,
+                        "nfev": infodict["nfev"],
+                        "status": ier,
+                        "failure": "",
+                    },
+                )
+            return result
 
         except Exception as e:
-            log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+            self.record_failure(
+                event, model_type, e, wall_time=time.perf_counter() - start
+            )
+            if self.cache is not None:
+                self.cache.put(
+                    cache_key,
+                    {
+                        "result": None,
+                        "nfev": np.nan,
+                        "status": np.nan,
+                        "failure": event.diagnostics[model_type]["failure"],
+                    },
+                )
 
     def calc_performance_metrics(self, y_obs, y_pred, popt, pcov, param_names):
 
@@ -464,15 +736,17 @@ class DrydownModel:
         # ___________________________________________________________________________________
         # Define the boundary condition for optimizing the tau_exp_model(t, delta_theta, theta_w, tau)
 
+        b = self.event_bounds.loc[event.index]
+
         ### Delta_theta ###
-        min_delta_theta = 0
-        max_delta_theta = self.data.max_sm - self.data.min_sm
-        ini_delta_theta = event.subset_sm_range
+        min_delta_theta = b["min_delta_theta"]
+        max_delta_theta = b["max_delta_theta"]
+        ini_delta_theta = b["ini_delta_theta"]
 
         ### Theta_w ###
-        min_theta_w = self.data.min_sm
-        max_theta_w = event.subset_min_sm
-        ini_theta_w = (min_theta_w + max_theta_w) / 2
+        min_theta_w = b["min_theta_w"]
+        max_theta_w = b["max_theta_w"]
+        ini_theta_w = b["ini_theta_w"]
 
         ### Tau ###
         min_tau = 0  # self.z * (self.data.max_sm - event.subset_min_sm) / event.pet
@@ -494,6 +768,7 @@ class DrydownModel:
             bounds=bounds,
             p0=p0,
             param_names=param_names,
+            model_type="tau_exp",
         )
 
     def fit_exp_model(self, event):
@@ -509,39 +784,22 @@ class DrydownModel:
         # ___________________________________________________________________________________
         # Define the boundary condition for optimizing the tau_exp_model(t, delta_theta, theta_w, tau)
 
+        b = self.event_bounds.loc[event.index]
+
         ### ETmax ###
-        min_ETmax = 0
-        if self.force_PET:
-            max_ETmax = event.pet
-            min_ETmax = event.pet * 0.2
-        else:
-            max_ETmax = np.inf
-            min_ETmax = 0
-        ini_ETmax = max_ETmax * 0.5
+        min_ETmax = b["min_ETmax"]
+        max_ETmax = b["max_ETmax"]
+        ini_ETmax = b["ini_ETmax"]
 
         ### theta_0 ###
-        first_non_nan = event.y[~np.isnan(event.y)][0]
-        min_theta_0 = first_non_nan - self.target_rmsd
-        max_theta_0 = np.minimum(
-            first_non_nan + self.target_rmsd, self.data.max_cutoff_sm
-        )
-        ini_theta_0 = first_non_nan
+        min_theta_0 = b["min_theta_0"]
+        max_theta_0 = b["max_theta_0"]
+        ini_theta_0 = b["ini_theta_0"]
 
         ### theta_star ###
-        # Filter out NaN values
-        second_non_nan = event.y[~np.isnan(event.y)][1]
-
-        if self.is_stage1ET_active:
-            if np.isnan(event.est_theta_fc):
-                max_theta_star = self.data.max_cutoff_sm
-            else:
-                max_theta_star = event.est_theta_fc
-
-            if np.isnan(event.est_theta_star):
-                min_theta_star = second_non_nan
-            else:
-                min_theta_star = np.maximum(event.est_theta_star, second_non_nan)
-            ini_theta_star = (max_theta_star + min_theta_star) / 2
+        min_theta_star = b["min_theta_star"]
+        max_theta_star = b["max_theta_star"]
+        ini_theta_star = b["ini_theta_star"]
 
         # ______________________________________________________________________________________
         # Execute the event fit
@@ -566,6 +824,7 @@ class DrydownModel:
                 bounds=bounds,
                 p0=p0,
                 param_names=param_names,
+                model_type="exp",
             )
         else:
             bounds = [(min_ETmax, min_theta_0), (max_ETmax, max_theta_0)]
@@ -584,6 +843,7 @@ class DrydownModel:
                 bounds=bounds,
                 p0=p0,
                 param_names=param_names,
+                model_type="exp",
             )
 
     def fit_q_model(self, event):
@@ -604,36 +864,22 @@ class DrydownModel:
         max_q = np.inf
         ini_q = 1.0 + 1.0e-03
 
+        b = self.event_bounds.loc[event.index]
+
         ### ETmax ###
-        if self.force_PET:
-            max_ETmax = event.pet
-            min_ETmax = event.pet * 0.2
-        else:
-            max_ETmax = np.inf
-            min_ETmax = 0
-        ini_ETmax = max_ETmax * 0.5
+        min_ETmax = b["min_ETmax"]
+        max_ETmax = b["max_ETmax"]
+        ini_ETmax = b["ini_ETmax"]
 
         ### theta_0 ###
-        first_non_nan = event.y[~np.isnan(event.y)][0]
-        min_theta_0 = first_non_nan - self.target_rmsd
-        max_theta_0 = np.minimum(
-            first_non_nan + self.target_rmsd, self.data.max_cutoff_sm
-        )
-        ini_theta_0 = first_non_nan
+        min_theta_0 = b["min_theta_0"]
+        max_theta_0 = b["max_theta_0"]
+        ini_theta_0 = b["ini_theta_0"]
 
         ### theta_star ###
-        second_non_nan = event.y[~np.isnan(event.y)][1]
-        if self.is_stage1ET_active:
-            if np.isnan(event.est_theta_fc):
-                max_theta_star = self.data.max_cutoff_sm
-            else:
-                max_theta_star = event.est_theta_fc
-
-            if np.isnan(event.est_theta_star):
-                min_theta_star = second_non_nan
-            else:
-                min_theta_star = np.maximum(event.est_theta_star, second_non_nan)
-            ini_theta_star = (max_theta_star + min_theta_star) / 2
+        min_theta_star = b["min_theta_star"]
+        max_theta_star = b["max_theta_star"]
+        ini_theta_star = b["ini_theta_star"]
 
         # ______________________________________________________________________________________
         # Execute the event fit
@@ -659,6 +905,7 @@ class DrydownModel:
                 bounds=bounds,
                 p0=p0,
                 param_names=param_names,
+                model_type="q",
             )
         else:
             bounds = [(min_q, min_ETmax, min_theta_0), (max_q, max_ETmax, max_theta_0)]
@@ -678,6 +925,7 @@ class DrydownModel:
                 bounds=bounds,
                 p0=p0,
                 param_names=param_names,
+                model_type="q",
             )
 
     def fit_sigmoid_model(self, event):
@@ -693,6 +941,7 @@ class DrydownModel:
         Returns:
             _type_: _description_
         """
+        start = time.perf_counter()
         try:
             # Observed time series data
             t_obs = event.x
@@ -731,6 +980,7 @@ class DrydownModel:
                 method="L-BFGS-B",
                 bounds=bounds,
             )  # You can choose a different method if needed
+            wall_time = time.perf_counter() - start
 
             # The result contains the optimized parameters
             theta50_best, k_best, a_best = result.x
@@ -750,10 +1000,41 @@ class DrydownModel:
             ss_res = np.sum(residuals**2)
             r_squared = 1 - ss_res / np.sum((event.y - np.nanmean(event.y)) ** 2)
 
+            event.add_diagnostics(
+                "sgm", nfev=result.nfev, status=result.status, wall_time=wall_time
+            )
             return popt, r_squared, y_opt
 
         except Exception as e:
-            log.debug(f"Exception raised in the thread {self.thread_name}: {e}")
+            self.record_failure(event, "sgm", e, wall_time=time.perf_counter() - start)
+
+    def get_event_metrics(self, event):
+        """Get the metrics of the event observations used to filter the events in the analysis
+
+        Args:
+            event (Event): the event
+
+        Returns:
+            dict: sm_range (observed range of soil moisture, normalized by the range of the pixel),
+                event_ndays (number of observed days), event_length (number of days from the start to the end),
+                and first3_avail2 (whether at least two of the first three days are observed)
+        """
+        if len(event.y) > 0 and event.max_sm != event.min_sm:
+            sm_range = abs(
+                (np.max(event.y) - np.min(event.y)) / (event.max_sm - event.min_sm)
+            )
+        else:
+            sm_range = np.nan
+
+        return {
+            "sm_range": float(sm_range),
+            "event_ndays": int(len(event.y)),
+            "event_length": int(
+                (pd.Timestamp(event.end_date) - pd.Timestamp(event.start_date)).days + 1
+            ),
+            # event.x holds the days with observations, counted from the start of the event
+            "first3_avail2": bool(np.count_nonzero(event.x < 3) >= 2),
+        }
 
     def return_result_df(self):
         """Return results in the pandas dataframe format for easier concatination"""
@@ -773,6 +1054,7 @@ class DrydownModel:
                     "est_theta_fc": event.est_theta_fc,
                     "pet": event.pet,
                 }
+                _results.update(self.get_event_metrics(event))
 
                 if self.run_tau_exp_model:
                     _results.update(
@@ -797,6 +1079,9 @@ class DrydownModel:
                             "tauexp_ss_res": event.tau_exp["ss_res"],
                             "tauexp_ss_tot": event.tau_exp["ss_tot"],
                             "tauexp_y_opt": event.tau_exp["y_opt"],
+                            "tauexp_nfev": event.diagnostics["tau_exp"]["nfev"],
+                            "tauexp_fit_status": event.diagnostics["tau_exp"]["status"],
+                            "tauexp_fit_time": event.diagnostics["tau_exp"]["wall_time"],
                         }
                     )
 
@@ -824,6 +1109,9 @@ class DrydownModel:
                             "exp_ss_res": event.exp["ss_res"],
                             "exp_ss_tot": event.exp["ss_tot"],
                             "exp_y_opt": event.exp["y_opt"],
+                            "exp_nfev": event.diagnostics["exp"]["nfev"],
+                            "exp_fit_status": event.diagnostics["exp"]["status"],
+                            "exp_fit_time": event.diagnostics["exp"]["wall_time"],
                         }
                     )
 
@@ -855,6 +1143,16 @@ class DrydownModel:
                             "q_ss_tot": event.q["ss_tot"],
                             "q_eq_1_p": event.q["q_eq_1_p"],
                             "q_y_opt": event.q["y_opt"],
+                            "q_nfev": event.diagnostics["q"]["nfev"],
+                            "q_fit_status": event.diagnostics["q"]["status"],
+                            "q_fit_time": event.diagnostics["q"]["wall_time"],
+                            "large_q_criteria": calc_large_q_criteria(
+                                q=event.q["q"],
+                                ETmax=event.q["ETmax"],
+                                theta_star=event.q["theta_star"],
+                                theta_w=event.q["theta_w"],
+                                z=self.z,
+                            ),
                         }
                     )
 
@@ -866,6 +1164,9 @@ class DrydownModel:
                             "sgm_a": event.sgm["a"],
                             "sgm_r_squared": event.sgm["r_squared"],
                             "sgm_y_opt": event.sgm["y_opt"],
+                            "sgm_nfev": event.diagnostics["sgm"]["nfev"],
+                            "sgm_fit_status": event.diagnostics["sgm"]["status"],
+                            "sgm_fit_time": event.diagnostics["sgm"]["wall_time"],
                         }
                     )
 
@@ -885,6 +1186,23 @@ class DrydownModel:
         else:
             return df_results
 
+    def return_diagnostics_df(self):
+        """Return the fit diagnostics of every event and model, including the failed fits, in the pandas dataframe format"""
+
+        diagnostics = [
+            {
+                "EASE_row_index": self.data.EASE_row_index,
+                "EASE_column_index": self.data.EASE_column_index,
+                "event_start": event.start_date,
+                "event_end": event.end_date,
+                "model": model_type,
+                **event.diagnostics[model_type],
+            }
+            for event in self.events
+            for model_type in event.diagnostics
+        ]
+        return pd.DataFrame(diagnostics)
+
     def plot_drydown_models(self, event, ax=None):
         # Plot exponential model
         date_range = pd.date_range(start=event.start_date, end=event.end_date, freq="D")
@@ -38,6 +38,36 @@ class Event:
         self.x = t[~np.isnan(sm_subset)]
         self.y = sm_subset[~np.isnan(sm_subset)]
 
+        # Fit diagnostics per model
+        self.diagnostics = {}
+
+    def add_diagnostics(
+        self,
+        model_type="",
+        nfev=np.nan,
+        status=np.nan,
+        wall_time=np.nan,
+        failure="",
+        cached=False,
+    ):
+        """Store the diagnostics of a model fit
+
+        Args:
+            model_type (str): "tau_exp", "exp", "q", or "sgm"
+            nfev (int): number of function evaluations used by the optimizer
+            status (int): termination status of the optimizer
+            wall_time (float): wall time of the fit, in seconds
+            failure (str): failure reason code; empty if the fit succeeded
+            cached (bool): whether the fit was reused from the fit cache
+        """
+        self.diagnostics[model_type] = {
+            "nfev": nfev,
+            "status": status,
+            "wall_time": wall_time,
+            "failure": failure,
+            "cached": cached,
+        }
+
     def add_attributes(
         self,
         model_type="",
@@ -61,15 +61,39 @@ class EventSeparator:
         self.max_nodata_days = self.cfg.getint("MODEL_PARAMS", "max_nodata_days")
         self.max_drydown_days = self.cfg.getint("MODEL_PARAMS", "max_drydown_days")
 
-    def separate_events(self, output_dir):
-        """Separate soil moisture timeseries into events"""
+        # Maximum days to shift the event start if it is raining, or if soil moisture is not available
+        self.max_look_ahead_days_precip = 3
+        self.max_look_ahead_days_nodata = 10
+        self.max_look_ahead_days = (
+            self.max_look_ahead_days_precip + self.max_look_ahead_days_nodata
+        )
+
+    def separate_events(self, output_dir, restart_date=None):
+        """Separate soil moisture timeseries into events
+
+        Args:
+            output_dir (str): output directory
+            restart_date (datetime, optional): if given, only the events starting on or after this date are separated. Defaults to None.
+        """
         self.output_dir = output_dir
 
         self.identify_event_starts()
+        if restart_date is not None:
+            # Starts flagged earlier than this cannot be shifted past restart_date by look_ahead
+            first_start_date = restart_date - pd.Timedelta(
+                days=self.max_look_ahead_days
+            )
+            self.data.df.loc[self.data.df.index < first_start_date, "event_start"] = (
+                False
+            )
         self.look_ahead()
         self.identify_event_ends()
 
         self.events_df = self.create_event_dataframe()
+        if restart_date is not None and not self.events_df.empty:
+            self.events_df = self.events_df[
+                self.events_df["event_start"] >= restart_date
+            ].reset_index(drop=True)
         if self.events_df.empty:
             return None
 
@@ -95,9 +119,8 @@ class EventSeparator:
             ].index
             for event_start_date in event_start_idx:
                 current_date = event_start_date
-                max_look_ahead_days = (
-                    3  # Maximum days to shift the event start if conditions are met
-                )
+                # Maximum days to shift the event start if conditions are met
+                max_look_ahead_days = self.max_look_ahead_days_precip
 
                 # Check conditions for the next few days and update event_start accordingly
                 for _ in range(max_look_ahead_days):
@@ -119,7 +142,8 @@ class EventSeparator:
         event_start_nan_idx = self.data.df.index[condition_mask]
         for _, event_start_date in enumerate(event_start_nan_idx):
             current_date = event_start_date
-            max_look_ahead_days = 10  # set a maximum number of days to look ahead
+            # set a maximum number of days to look ahead
+            max_look_ahead_days = self.max_look_ahead_days_nodata
 
             # Loop to find the next date without NaN sm_masked or until max days reached
             for _ in range(max_look_ahead_days):
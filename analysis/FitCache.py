@@ -0,0 +1,113 @@
+import os
+import pickle
+import hashlib
+import numpy as np
+from MyLogger import getLogger
+
+__author__ = "Ryoko Araki"
+__contact__ = "raraki@ucsb.edu"
+__copyright__ = "Copyright 2024, SMAP-drydown project, @RY4GIT"
+__license__ = "MIT"
+__status__ = "Dev"
+__url__ = ""
+
+# Create a logger
+log = getLogger(__name__)
+
+# Increment when the drydown models or the fitting procedure change, to invalidate the existing cache entries
+CACHE_VERSION = 1
+
+
+class FitCache:
+    """Persistent, content-addressed cache of event-level model fits
+
+    Each entry is stored in its own file, named by the hash of everything that determines the fit (event data, bounds,
+    initial values, model name and model parameters), so that it can be shared safely between processes and reruns.
+    """
+
+    def __init__(self, cfg):
+        self.cache_dir = cfg.get("CACHE", "cache_dir")
+        self.max_size = cfg.getfloat("CACHE", "max_cache_size_mb") * 1024**2
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, model_type, x, y, bounds, p0, params):
+        """Get the hash key of a fit
+
+        Args:
+            model_type (str): name of the model
+            x (np.array): timesteps of the event
+            y (np.array): soil moisture observations of the event
+            bounds (list): lower and upper bounds of the parameters
+            p0 (list): initial values of the parameters
+            params (tuple): other model parameters affecting the fit (e.g., z, theta_w)
+
+        Returns:
+            str: hexadecimal hash key
+        """
+        h = hashlib.sha256()
+        h.update(f"{CACHE_VERSION}|{model_type}|{params!r}".encode())
+        for array in (x, y, bounds, p0):
+            h.update(np.ascontiguousarray(array, dtype=float).tobytes())
+        return h.hexdigest()
+
+    def get_filepath(self, key):
+        """Get the file path of an entry, sharded into subdirectories by the first two characters of the key"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        """Get a cached entry, or None if it does not exist"""
+        filepath = self.get_filepath(key)
+        try:
+            with open(filepath, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(filepath)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry; written to a temporary file first so that readers never see a partial file"""
+        filepath = self.get_filepath(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filepath, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filepath, filepath)
+        except OSError as e:
+            log.debug(f"Failed to write the cache entry {key}: {e}")
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_cache_size_mb"""
+        entries = []
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                filepath = os.path.join(root, filename)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filepath))
+
+        total_size = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, filepath in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(filepath)
+                total_size -= size
+                n_evicted += 1
+            except OSError:
+                continue
+
+        log.info(
+            f"Fit cache: {len(entries) - n_evicted} entries ({total_size / 1024**2:.1f} MB), {n_evicted} evicted"
+        )
@@ -1,4 +1,5 @@
 import logging
+import os
 
 __author__ = "Ryoko Araki"
 __contact__ = "raraki@ucsb.edu"
@@ -15,13 +16,6 @@ def getLogger(name):
     # Configure logging
     log.setLevel(logging.DEBUG)  # Set the log level for the logger
 
-    # Create a handler for writing log messages to a file
-    file_handler = logging.FileHandler("log.txt")
-    file_handler.setLevel(logging.DEBUG)  # Set the log level for the file handler
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    )
-
     # Create a handler for printing log messages to the console
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)  # Set the log level for console output
@@ -29,13 +23,34 @@ def getLogger(name):
         logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
     )
 
-    # Add the handlers to the logger
-    log.addHandler(file_handler)
+    # Add the handler to the logger; the log file is added by the entry point with addFileHandler
     log.addHandler(console_handler)
 
     return log
 
 
+def addFileHandler(filename="log.txt"):
+    # Write the log messages of all the loggers to a file. Called by the entry point of the analysis (and its worker
+    # processes), so that importing the modules, e.g., from the notebooks, does not create log files
+    root_log = logging.getLogger()
+    if any(
+        isinstance(handler, logging.FileHandler)
+        and handler.baseFilename == os.path.abspath(filename)
+        for handler in root_log.handlers
+    ):
+        return
+
+    # Create a handler for writing log messages to a file
+    file_handler = logging.FileHandler(filename)
+    file_handler.setLevel(logging.DEBUG)  # Set the log level for the file handler
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+
+    # The loggers of the modules pass their messages on to the root logger
+    root_log.addHandler(file_handler)
+
+
 def modifyLogger(name, custom_handler):
     # Create an instance of the custom handler
     logger = getLogger(name)
@@ -32,8 +32,8 @@ class SMAPgrid:
         self.output_dir = cfg["PATHS"]["output_dir"]
 
         self.get_attributes()
-        self.coord_info = self.get_coordinates()
-        self.coord_info_subset = self.get_subset()
+        self.latitude, self.longitude, self.is_openwater = self.get_grid()
+        self.subset_mask = self.get_subset()
 
         self.template_xarray = self.get_template_xarray()
 
@@ -51,14 +51,94 @@ class SMAPgrid:
                 "min_lon should be less than max_lon, and min_lat should be less than max_lat"
             )
 
+    def get_grid(self):
+        """Get the latitude of each EASE row, the longitude of each EASE column, and the 2-D openwater mask over (row, column)
+
+        Built from the source files once, and cached in binary form; rebuilt if any of the source files is updated
+        """
+        cache_file_path = os.path.join(
+            self.data_dir, self.datarods_dir, "EASE_grid_mask_36km.npz"
+        )
+        openwater_file_path = os.path.join(
+            self.data_dir, self.datarods_dir, "coord_open_water.csv"
+        )
+        source_file_paths = [
+            os.path.join(self.data_dir, self.datarods_dir, filename)
+            for filename in [
+                "coord_open_water.csv",
+                "EASE_grid_36km.npz",
+                "coord_info.csv",
+            ]
+        ]
+        source_mtime = max(
+            os.path.getmtime(file_path)
+            for file_path in source_file_paths
+            if os.path.exists(file_path)
+        )
+        if (
+            os.path.exists(cache_file_path)
+            and os.path.getmtime(cache_file_path) >= source_mtime
+        ):
+            with np.load(cache_file_path) as grid:
+                return grid["latitude"], grid["longitude"], grid["is_openwater"]
+
+        latitude, longitude = self.get_coordinates()
+        is_openwater = self.get_openwater_mask(
+            openwater_file_path, shape=(len(latitude), len(longitude))
+        )
+        try:
+            with open(f"{cache_file_path}.{os.getpid()}.tmp", "wb") as f:
+                np.savez(
+                    f, latitude=latitude, longitude=longitude, is_openwater=is_openwater
+                )
+            os.replace(f"{cache_file_path}.{os.getpid()}.tmp", cache_file_path)
+        except OSError as e:
+            log.warning(f"Failed to cache the EASE grid: {e}")
+        return latitude, longitude, is_openwater
+
     def get_coordinates(self):
-        """Get the information on the coordinate-index pair"""
-        file_path = os.path.join(self.data_dir, self.datarods_dir, "coord_info.csv")
-        coord_info = pd.read_csv(file_path)
-        return coord_info
+        """Get the latitude and longitude of the EASE rows and columns, positioned by their EASE index"""
+        # The EASE grid saved by data_mng/ease_grid.py is much smaller and faster to read than the csv of all the pixels
+        grid_file_path = os.path.join(
+            self.data_dir, self.datarods_dir, "EASE_grid_36km.npz"
+        )
+        if os.path.exists(grid_file_path):
+            with np.load(grid_file_path) as grid:
+                row_index, _latitude = grid["EASE_row_index"], grid["latitude"]
+                column_index, _longitude = grid["EASE_column_index"], grid["longitude"]
+        else:
+            file_path = os.path.join(
+                self.data_dir, self.datarods_dir, "coord_info.csv"
+            )
+            coord_info = pd.read_csv(file_path)
+            row_index, _latitude = (
+                coord_info["EASE_row_index"].values,
+                coord_info["latitude"].values,
+            )
+            column_index, _longitude = (
+                coord_info["EASE_column_index"].values,
+                coord_info["longitude"].values,
+            )
+
+        # Rows and columns without data have the index -1
+        latitude = np.full(row_index.max() + 1, np.nan)
+        latitude[row_index[row_index >= 0]] = _latitude[row_index >= 0]
+        longitude = np.full(column_index.max() + 1, np.nan)
+        longitude[column_index[column_index >= 0]] = _longitude[column_index >= 0]
+        return latitude, longitude
+
+    def get_openwater_mask(self, file_path, shape):
+        """Get the 2-D mask of the openwater pixels"""
+        coord_open_water = pd.read_csv(file_path)
+        is_openwater = np.zeros(shape, dtype=bool)
+        is_openwater[
+            coord_open_water["EASE_row_index"].values,
+            coord_open_water["EASE_column_index"].values,
+        ] = True
+        return is_openwater
 
     def get_subset(self):
-        """Get the subset of the extent specified in the config file"""
+        """Get the 2-D mask of the pixels in the subset of the extent specified in the config file"""
         # Get the subset of the extent
         _subset = self.crop_by_extent()
         # Mask with openwater
@@ -67,52 +147,38 @@ class SMAPgrid:
 
     def crop_by_extent(self):
         """Crop the coordinate into subset of the extent specified in the config file"""
-        subset = self.coord_info[
-            (self.coord_info["latitude"] >= self.min_lat)
-            & (self.coord_info["latitude"] <= self.max_lat)
-            & (self.coord_info["longitude"] >= self.min_lon)
-            & (self.coord_info["longitude"] <= self.max_lon)
-        ].copy()
+        is_in_lat = (self.latitude >= self.min_lat) & (self.latitude <= self.max_lat)
+        is_in_lon = (self.longitude >= self.min_lon) & (
+            self.longitude <= self.max_lon
+        )
+        subset = np.outer(is_in_lat, is_in_lon)
         if self.verbose:
-            log.info(f"Number of pixels in the spatial extent: {len(subset)}")
+            log.info(f"Number of pixels in the spatial extent: {subset.sum()}")
 
         ### Mask with openwater pixels
         return subset
 
     def mask_by_openwater(self, _subset):
         """Mask the coordinate if they are on the openwater"""
-        file_path = os.path.join(
-            self.data_dir, self.datarods_dir, "coord_open_water.csv"
-        )
-        coord_open_water = pd.read_csv(file_path)
-        subset = (
-            pd.merge(
-                _subset,
-                coord_open_water,
-                on=["EASE_row_index", "EASE_column_index"],
-                how="left",
-                indicator=True,
-            )
-            .query('_merge == "left_only"')
-            .drop(columns="_merge")
-        )
+        subset = _subset & ~self.is_openwater
         if self.verbose:
-            log.info(f"Number of pixels without openwater: {len(subset)}")
+            log.info(f"Number of pixels without openwater: {subset.sum()}")
         return subset
 
     def get_EASE_index_subset(self):
         """Get the list of EASE index of the extent"""
-        return self.coord_info_subset[["EASE_row_index", "EASE_column_index"]].values
+        return np.argwhere(self.subset_mask)
 
     def get_EASE_coordinate_subset(self):
         """Get the list of EASE coordinates of the extent"""
-        return self.coord_info_subset[["latitude", "longitude"]].to_list()
+        rows, columns = np.nonzero(self.subset_mask)
+        return np.column_stack([self.latitude[rows], self.longitude[columns]]).tolist()
 
     def get_template_xarray(self):
         """Get the template xaray with nan data with EASE coordinates of the extent"""
-        # Create a 2D numpy array filled with NaNs
-        y_coords = sorted(set(self.coord_info["latitude"]), reverse=True)
-        x_coords = sorted(set(self.coord_info["longitude"]))
+        # Create a 2D numpy array filled with NaNs; positions along y and x are the EASE row and column indices
+        y_coords = self.latitude
+        x_coords = self.longitude
         _data = np.empty((len(y_coords), len(x_coords)))
         _data[:] = np.nan
 
@@ -121,20 +187,42 @@ class SMAPgrid:
         da.attrs["crs"] = "EPSG:4326"  # pyproj.CRS.from_epsg(4326)
         return da
 
-    def remap_results(self, df_results):
-        # Save results in a dataarray format
-        da = self.template_xarray.copy()
-        for index, row in df_results.iterrows():
-            i = row["EASE_row_index"]
-            j = row["EASE_column_index"]
-            avg_q = np.average(row["q_q"])
-            da.isel(y=i, x=j).values = avg_q
+    def remap_results(
+        self,
+        df_results,
+        variables=("q_q",),
+        stats=("mean", "median", "count"),
+        filename="output_q.nc",
+    ):
+        """Reduce the results of the events in each pixel and map them onto the EASE grid
+
+        Args:
+            df_results (pd.DataFrame): results of the events
+            variables (tuple, optional): result columns to map. Defaults to ("q_q",).
+            stats (tuple, optional): reductions over the events of each pixel. Defaults to ("mean", "median", "count").
+            filename (str, optional): output NetCDF file in the output directory. Defaults to "output_q.nc".
+
+        Returns:
+            xr.Dataset: one variable per result column and reduction, named <column>_<reduction>
+        """
+        df_stats = df_results.groupby(["EASE_row_index", "EASE_column_index"])[
+            list(variables)
+        ].agg(list(stats))
+        i = df_stats.index.get_level_values("EASE_row_index").values.astype(int)
+        j = df_stats.index.get_level_values("EASE_column_index").values.astype(int)
+
+        # Save results in a dataset format; the positions in the template are the EASE indices
+        ds = xr.Dataset(coords=self.template_xarray.coords)
+        for variable, stat in df_stats.columns:
+            _data = np.full(self.template_xarray.shape, np.nan)
+            _data[i, j] = df_stats[(variable, stat)].values
+            ds[f"{variable}_{stat}"] = (("y", "x"), _data)
+        ds.attrs["crs"] = self.template_xarray.attrs["crs"]
 
         # Save the data
-        filename = f"output_q.nc"
-        da.to_netcdf(os.path.join(self.output_dir, filename))
+        ds.to_netcdf(os.path.join(self.output_dir, filename))
 
-        return da
+        return ds
 
     # Not working
     # def plot_remapped_results(self, da):
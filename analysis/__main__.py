@@ -3,7 +3,7 @@ from configparser import ConfigParser
 import time
 
 from Agent import Agent
-from MyLogger import getLogger
+from MyLogger import getLogger, addFileHandler
 
 __author__ = "Ryoko Araki"
 __contact__ = "raraki@ucsb.edu"
@@ -19,6 +19,7 @@ log = getLogger(__name__)
 def main():
     """Main execution script ot run the drydown analysis"""
     start = time.perf_counter()
+    addFileHandler()
     log.info("--- Initializing the model ---")
 
     # _______________________________________________________________________________________________
@@ -49,12 +50,12 @@ def main():
 
     # Run the model
     if run_mode == "serial":
-        results = agent.run(
-            [5, 254]
-        )  # Pick your EASE_row_index and EASE_column_index of interest: [85, 206]
+        results = [
+            agent.run([5, 254])
+        ]  # Pick your EASE_row_index and EASE_column_index of interest: [85, 206]
     elif run_mode == "parallel":
         nprocess = cfg.getint("MULTIPROCESSING", "nprocess")
-        with mp.Pool(nprocess) as pool:
+        with mp.Pool(nprocess, initializer=addFileHandler) as pool:
             results = list(pool.imap(agent.run, agent.target_EASE_idx))
         pool.close()
         pool.join()
@@ -62,28 +63,18 @@ def main():
         log.info(
             "run_mode in config is invalid: should be either 'serial' or 'parallel'"
         )
+        results = []
 
     # _______________________________________________________________________________________________
     # Finalize the model
     log.info(f"--- Finished analysis ---")
 
-    if run_mode == "serial":
-        if results.empty:
-            log.info("No results are returned")
-        else:
-            try:
-                agent.finalize(results)
-            except NameError:
-                log.info("No results are returned")
-
-    elif run_mode == "parallel":
-        if not results:
-            log.info("No results are returned")
-        else:
-            try:
-                agent.finalize(results)
-            except NameError:
-                log.info("No results are returned")
+    # Skip the pixels without results
+    results = [result for result in results if result is not None]
+    if not results:
+        log.info("No results are returned")
+    else:
+        agent.finalize(results)
 
     end = time.perf_counter()
     log.info(f"Run took : {(end - start):.6f} seconds")
@@ -0,0 +1,38 @@
+import numpy as np
+
+__author__ = "Ryoko Araki"
+__contact__ = "raraki@ucsb.edu"
+__copyright__ = "Copyright 2024, SMAP-drydown project, @RY4GIT"
+__license__ = "MIT"
+__status__ = "Dev"
+__url__ = ""
+
+# Criteria of the fitted drydowns, shared with the notebooks: numpy only, so that importing them does not load the fitting code
+
+
+def calc_large_q_criteria(q, ETmax, theta_star, theta_w, z=50.0):
+    """
+    Relative change of the loss rate over the first day of Stage II, starting from theta_star.
+    At theta_star the loss rate is -k, so the change is 1 - ((theta(t=1) - theta_w) / (theta_star - theta_w)) ** q,
+    with theta(t=1) from q_model(t=1, theta_0=theta_star). Works on scalars and on arrays of events alike.
+
+    Parameters:
+        q (float): Degree of non-linearity in the soil moisture response.
+        ETmax (float): Maximum evapotranpisration rate in mm/day.
+        theta_star (float): Critical soil moisture content, in m3/m3
+        theta_w (float): Wilting point soil moisture content, in m3/m3
+        z (float): Soil thicness in mm. Default is 50 mm
+
+    Returns:
+        float: Relative change of the loss rate, in -; NaN if the drydown does not reach t=1 in Stage II
+    """
+    # Cast to numpy floats, so that a negative base returns NaN rather than a complex number
+    q, ETmax, theta_star, theta_w = (
+        np.asarray(x, dtype=np.float64) for x in (q, ETmax, theta_star, theta_w)
+    )
+    k = ETmax / z
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        b = (theta_star - theta_w) ** (1 - q)
+        a = (1 - q) / ((theta_star - theta_w) ** q)
+        theta_1 = (-k * a + b) ** (1 / (1 - q)) + theta_w
+        return 1 - ((theta_1 - theta_w) / (theta_star - theta_w)) ** q
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+import os
+from functools import lru_cache
+from MyLogger import getLogger
+
+__author__ = "Ryoko Araki"
+__contact__ = "raraki@ucsb.edu"
+__copyright__ = "Copyright 2024, SMAP-drydown project, @RY4GIT"
+__license__ = "MIT"
+__status__ = "Dev"
+__url__ = ""
+
+# Create a logger
+log = getLogger(__name__)
+
+# Number of pixels kept decoded in memory
+cache_size = 64
+
+
+def get_filename(varname, EASE_row_index, EASE_column_index):
+    """Get the filename of the datarod"""
+    filename = f"{varname}_{EASE_row_index:03d}_{EASE_column_index:03d}.csv"
+    return filename
+
+
+def set_time_index(df, index_name="time"):
+    """Set the datetime index to the pandas dataframe"""
+    df[index_name] = pd.to_datetime(df[index_name])
+    return df.set_index("time")
+
+
+@lru_cache(maxsize=cache_size)
+def read_datarod(data_dir, datarods_dir, varname, EASE_row_index, EASE_column_index):
+    """Read the csv datarod of a pixel, with the datetime index. Cached; do not modify the returned dataframe"""
+    fn = get_filename(
+        varname,
+        EASE_row_index=EASE_row_index,
+        EASE_column_index=EASE_column_index,
+    )
+    _df = pd.read_csv(os.path.join(data_dir, datarods_dir, varname, fn))
+    return set_time_index(_df, index_name="time")
+
+
+def get_dataframe(
+    data_dir,
+    datarods_dir,
+    varname,
+    EASE_row_index,
+    EASE_column_index,
+    start_date=None,
+    end_date=None,
+):
+    """Get the pandas dataframe for a datarod of interest
+
+    Args:
+        varname (string): name of the variable: "SPL3SMP", "PET", "SPL4SMGP"
+        start_date (datetime, optional): start of the period. Defaults to the start of the datarod.
+        end_date (datetime, optional): end of the period. Defaults to the end of the datarod.
+
+    Returns:
+        dataframe: Return dataframe with datetime index, cropped for the timeperiod for a variable
+    """
+    _df = read_datarod(
+        data_dir, datarods_dir, varname, EASE_row_index, EASE_column_index
+    )
+    return _df[start_date:end_date].copy()
+
+
+@lru_cache(maxsize=cache_size)
+def read_soil_moisture(
+    data_dir,
+    datarods_dir,
+    EASE_row_index,
+    EASE_column_index,
+    start_date=None,
+    end_date=None,
+    varname="SPL3SMP",
+):
+    """QC the soil moisture datarod of a pixel, and merge the AM and PM retrievals. Cached; do not modify the returned dataframe"""
+
+    # Get variable dataframe
+    _df = get_dataframe(
+        data_dir,
+        datarods_dir,
+        varname,
+        EASE_row_index,
+        EASE_column_index,
+        start_date,
+        end_date,
+    )
+
+    # Use retrieval flag to quality control the data
+    condition_bad_data_am = (
+        _df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 0.0
+    ) & (_df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 8.0)
+    condition_bad_data_pm = (
+        _df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 0.0
+    ) & (_df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 8.0)
+    _df.loc[condition_bad_data_am, "Soil_Moisture_Retrieval_Data_AM_soil_moisture"] = (
+        np.nan
+    )
+    _df.loc[
+        condition_bad_data_pm, "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm"
+    ] = np.nan
+
+    # If there is two different versions of 2015-03-31 data --- remove this
+    df = _df.loc[~_df.index.duplicated(keep="first")]
+
+    # Resample to regular time interval
+    df = df.resample("D").asfreq()
+
+    # Merge the AM and PM soil moisture data into one daily timeseries of data
+    df["sm"] = df[
+        [
+            "Soil_Moisture_Retrieval_Data_AM_soil_moisture",
+            "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm",
+        ]
+    ].mean(axis=1, skipna=True)
+
+    return df
+
+
+@lru_cache(maxsize=cache_size)
+def read_pet(
+    data_dir,
+    datarods_dir,
+    EASE_row_index,
+    EASE_column_index,
+    start_date=None,
+    end_date=None,
+    varname="PET",
+):
+    """Get the daily PET datarod of a pixel. Cached; do not modify the returned dataframe"""
+
+    # Get variable dataframe
+    _df = get_dataframe(
+        data_dir,
+        datarods_dir,
+        varname,
+        EASE_row_index,
+        EASE_column_index,
+        start_date,
+        end_date,
+    )
+
+    # Drop unnccesary dimension
+    _df = _df.drop(columns=["x", "y"])
+
+    # Resample to regular time intervals
+    return _df.resample("D").asfreq()
+
+
+@lru_cache(maxsize=cache_size)
+def read_precipitation(
+    data_dir,
+    datarods_dir,
+    EASE_row_index,
+    EASE_column_index,
+    start_date=None,
+    end_date=None,
+    varname="SPL4SMGP",
+):
+    """Get the daily precipitation datarod of a pixel, in mm/day. Cached; do not modify the returned dataframe"""
+
+    # Get variable dataframe
+    _df = get_dataframe(
+        data_dir,
+        datarods_dir,
+        varname,
+        EASE_row_index,
+        EASE_column_index,
+        start_date,
+        end_date,
+    )
+
+    # Drop unnccesary dimension and change variable name
+    _df = _df.drop(columns=["x", "y"]).rename(
+        {"precipitation_total_surface_flux": "precip"}, axis="columns"
+    )
+
+    # Convert precipitation from kg/m2/s to mm/day -> 1 kg/m2/s = 86400 mm/day
+    _df.precip = _df.precip * 86400
+
+    # Resample to regular time interval
+    return _df.resample("D").asfreq()
+
+
+def get_soil_moisture(*args, **kwargs):
+    """Get the QC'd daily soil moisture ("sm" column) of a pixel; see read_soil_moisture for the arguments"""
+    return read_soil_moisture(*args, **kwargs).copy()
+
+
+def get_pet(*args, **kwargs):
+    """Get the daily PET of a pixel; see read_pet for the arguments"""
+    return read_pet(*args, **kwargs).copy()
+
+
+def get_precipitation(*args, **kwargs):
+    """Get the daily precipitation ("precip" column, mm/day) of a pixel; see read_precipitation for the arguments"""
+    return read_precipitation(*args, **kwargs).copy()
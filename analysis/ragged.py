@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+import os
+import hashlib
+from MyLogger import getLogger
+
+__author__ = "Ryoko Araki"
+__contact__ = "raraki@ucsb.edu"
+__copyright__ = "Copyright 2024, SMAP-drydown project, @RY4GIT"
+__license__ = "MIT"
+__status__ = "Dev"
+__url__ = ""
+
+# Create a logger
+log = getLogger(__name__)
+
+
+def is_ragged_column(column):
+    """Check if the result column holds one array per event (the observations, and the fitted curve of each model)"""
+    return column in ["time", "sm"] or column.endswith("_y_opt")
+
+
+def get_ragged_filename(filepath):
+    """Get the filename of the ragged columns saved next to a results csv file"""
+    return f"{os.path.splitext(filepath)[0]}_ragged.npz"
+
+
+def get_file_hash(filenames):
+    """Get a hash of the contents of the files"""
+    sha = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+class RaggedArray:
+    """Variable-length arrays (one per event), stored as one flat buffer of values and the offsets of each array in it"""
+
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, arrays, dtype=float):
+        """Pack a sequence of arrays; anything that is not an array or list (e.g., NaN) is packed as an empty array"""
+        arrays = [
+            np.asarray(a, dtype=dtype).ravel()
+            if isinstance(a, (np.ndarray, list, tuple))
+            else np.empty(0, dtype=dtype)
+            for a in arrays
+        ]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in arrays], out=offsets[1:])
+        values = np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+        return cls(values, offsets)
+
+    @classmethod
+    def from_strings(cls, series, dtype=float):
+        """Parse a column of stringified arrays or lists (e.g., "[0.31 0.29 nan\\n 0.25]"), as saved in the csv files of the earlier results"""
+        strings = (
+            pd.Series(series)
+            .fillna("")
+            .astype(str)
+            .str.replace(",", " ")
+            .str.strip("[]")
+        )
+        tokens = strings.str.split()
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum(tokens.str.len().to_numpy(), out=offsets[1:])
+        values = np.array(" ".join(strings).split(), dtype=float).astype(dtype)
+        return cls(values, offsets)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Get the array of the i-th event, as a view of the buffer"""
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+    def segment_ids(self):
+        """Get the event number of each value in the buffer"""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def positions(self):
+        """Get the position of each value within the array of its event"""
+        return np.arange(len(self.values)) - np.repeat(self.offsets[:-1], self.lengths)
+
+    def reduce(self, ufunc, empty_value=np.nan):
+        """Reduce the array of each event with a ufunc (e.g., np.fmax), in one call over the buffer"""
+        result = np.full(len(self), empty_value, dtype=float)
+        is_nonempty = self.lengths > 0
+        if is_nonempty.any():
+            result[is_nonempty] = ufunc.reduceat(
+                self.values, self.offsets[:-1][is_nonempty]
+            )
+        return result
+
+    def nanmin(self):
+        return self.reduce(np.fmin)
+
+    def nanmax(self):
+        return self.reduce(np.fmax)
+
+    def count(self, where=None):
+        """Count the non-NaN values of each event, or the values where the mask of the buffer is True"""
+        if where is None:
+            where = ~np.isnan(self.values)
+        return np.bincount(self.segment_ids()[where], minlength=len(self))
+
+
+def write_results(df, filepath, **kwargs):
+    """Save the results; the array columns are packed into ragged arrays saved next to the csv file, with the hash of the
+    csv file to check that they still belong together when read
+
+    Args:
+        df (pd.DataFrame): results, with one array per event in the ragged columns
+        filepath (str): path to the csv file
+        **kwargs: passed to pd.DataFrame.to_csv
+    """
+    ragged_columns = [column for column in df.columns if is_ragged_column(column)]
+    buffers = {}
+    for column in ragged_columns:
+        ragged = RaggedArray.from_arrays(
+            df[column], dtype=np.int64 if column == "time" else float
+        )
+        buffers[f"{column}__values"] = ragged.values
+        buffers[f"{column}__offsets"] = ragged.offsets
+    df.drop(columns=ragged_columns).to_csv(filepath, **kwargs)
+    np.savez(
+        get_ragged_filename(filepath), csv_hash=get_file_hash([filepath]), **buffers
+    )
+
+
+def read_ragged_columns(filepath):
+    """Read the ragged arrays saved next to a results csv file
+
+    Returns:
+        dict: RaggedArray of each column
+        str: hash of the csv file the arrays were saved with (None for the arrays saved without it)
+    """
+    with np.load(get_ragged_filename(filepath)) as buffers:
+        columns = [key[: -len("__values")] for key in buffers if key.endswith("__values")]
+        return {
+            column: RaggedArray(
+                buffers[f"{column}__values"], buffers[f"{column}__offsets"]
+            )
+            for column in columns
+        }, (str(buffers["csv_hash"]) if "csv_hash" in buffers else None)
+
+
+def check_ragged_columns(filepath, df):
+    """Read the ragged arrays saved next to a results csv file, if they match the rows read from it
+
+    Returns:
+        dict: RaggedArray of each column, or None if there are no ragged arrays or they do not match the csv file
+            (a subset of the rows was read, e.g., with nrows, or the csv file was saved again without them)
+    """
+    if not os.path.exists(get_ragged_filename(filepath)):
+        log.info(f"No ragged arrays for {filepath}: parsing the arrays in the csv file")
+        return None
+    ragged_columns, csv_hash = read_ragged_columns(filepath)
+    if csv_hash is not None and csv_hash != get_file_hash([filepath]):
+        log.warning(f"The ragged arrays of {filepath} were saved with another version of the csv file")
+        return None
+    if any(len(ragged) != len(df) for ragged in ragged_columns.values()):
+        log.warning(
+            f"The ragged arrays of {filepath} have a different number of events than the {len(df)} rows read from it"
+        )
+        return None
+    return ragged_columns
+
+
+def read_results(filepath, **kwargs):
+    """Read the results, with one array per event in the ragged columns.
+    The results saved before the ragged arrays were introduced are parsed from the stringified arrays in the csv file
+
+    Args:
+        filepath (str): path to the csv file
+        **kwargs: passed to pd.read_csv
+
+    Raises:
+        ValueError: if the ragged arrays do not match the rows read and the csv file has no arrays to parse instead
+
+    Returns:
+        pd.DataFrame: results
+    """
+    df = pd.read_csv(filepath, **kwargs)
+    ragged_columns = check_ragged_columns(filepath, df)
+    if ragged_columns is None:
+        if os.path.exists(get_ragged_filename(filepath)) and not any(
+            is_ragged_column(column) for column in df.columns
+        ):
+            raise ValueError(
+                f"The ragged arrays of {filepath} do not match the rows read from it, and the csv file has no arrays "
+                "to parse instead: read the whole file (without nrows, skiprows, ...) and subset the results afterwards, "
+                "and save the results with write_results only"
+            )
+        ragged_columns = {
+            column: RaggedArray.from_strings(
+                df[column], dtype=np.int64 if column == "time" else float
+            )
+            for column in df.columns
+            if is_ragged_column(column)
+        }
+
+    for column, ragged in ragged_columns.items():
+        df[column] = pd.Series(ragged.to_list(), index=df.index, dtype=object)
+    return df
@@ -6,7 +6,7 @@ import pandas as pd
 import os
 import matplotlib.pyplot as plt
 from tqdm import tqdm
-import multiprocessing
+from transpose_datarods import load_cube
 
 # Define configurations
 start_year = '2016'
@@ -15,51 +15,61 @@ data_dir = r'/home/waves/projects/smap-drydown/data'
 datarods_dir = 'datarods'
 SMAPL4_varname = 'SPL4SMGP'
 PET_varname = 'PET'
-# 
+# On-disk (time, y, x) grids written by the datarods builders
+precip_cube_filename = os.path.join(data_dir, SMAPL4_varname, f"{SMAPL4_varname}_precipitation_total_surface_flux_EASEgrid.npy")
+pet_cube_filename = os.path.join(data_dir, PET_varname, f"{PET_varname}_EASEgrid.npy")
+time_chunk_size = 32
+
 # %%
-# Loop through all the rows
-def process_row(row_index, row_data):
-    EASE_row_index = int(row_data['EASE_row_index'])
-    EASE_column_index = int(row_data['EASE_column_index'])
+def calc_annual_sums(cube, time_index, years, time_chunk_size=time_chunk_size):
+    """Sum an on-disk (time, y, x) grid by year, reading one chunk of timesteps at a time
 
-    # %%
-    # Read Precipitation data
-    filename = os.path.join(data_dir, datarods_dir, SMAPL4_varname, f"{SMAPL4_varname}_{EASE_row_index:03d}_{EASE_column_index:03d}.csv")
-    df_p = pd.read_csv(filename).drop(columns=['x','y']).rename({'precipitation_total_surface_flux': 'precip'}, axis='columns')
-    df_p['time'] = pd.to_datetime(df_p['time'])
-    df_p.set_index('time', inplace=True)
-    df_p.precip = df_p.precip * 86400
-    df_p.head()
+    Args:
+        cube (np.array): (time, y, x) array, typically memory-mapped
+        time_index (np.array): indices of the timesteps to use
+        years (np.array): year of each of these timesteps
+        time_chunk_size (int, optional): number of timesteps read at once
 
-    # %%
-    # Read PET data
-    filename = os.path.join(data_dir, datarods_dir, PET_varname, f"{PET_varname}_{EASE_row_index:03d}_{EASE_column_index:03d}.csv")
-    df_pet = pd.read_csv(filename).drop(columns=['x','y']) #.rename({'precipitation_total_surface_flux': 'precip'}, axis='columns')
-    df_pet['time'] = pd.to_datetime(df_pet['time'])
-    df_pet.set_index('time', inplace=True)
-    df_pet.head()
+    Returns:
+        tuple: unique years, and (year, y, x) array of the sums; NaN counts as zero as in pandas resample().sum()
+    """
+    unique_years, year_index = np.unique(years, return_inverse=True)
+    annual_sums = np.zeros((len(unique_years), *cube.shape[1:]))
+    for i_start in range(0, len(time_index), time_chunk_size):
+        i_end = i_start + time_chunk_size
+        block = cube[time_index[i_start:i_end]]
+        for i_year in np.unique(year_index[i_start:i_end]):
+            annual_sums[i_year] += np.nansum(block[year_index[i_start:i_end] == i_year], axis=0)
+    return unique_years, annual_sums
 
-    # %%
-    # Join both timeseries
-    _df = pd.merge(df_p, df_pet, how='inner', left_index=True, right_index=True)
-    df = _df[start_year:end_year].copy()
-    # df
-    # %%
-    # Get the MAP and MAE (mean annuap preciptiation and evapotranspiration)
-    df_annual = df.resample('A').sum()
-    # df_annual
-    # %%
-    # Calculate aridity index each year 
-    df_annual["AI"] = df_annual.precip / df_annual.pet
-    # df_annual
-    # %%
-    # Get the average values across the years 
-    avg_AI = df_annual.AI.mean()
-    return row_index, EASE_row_index, EASE_column_index, avg_AI
 
-# The main function to setup and run the multiprocessing pool
+def calc_mean_annual_ratio(annual_numerator, annual_denominator):
+    """Ratio of the annual sums (e.g., P/PET) of each year, averaged across the years (axis 0)"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nanmean(annual_numerator / annual_denominator, axis=0)
+
+
+def calc_aridity_index():
+    """Calculate the mean annual aridity index (P/PET) of all the pixels at once"""
+    precip, precip_time = load_cube(precip_cube_filename)
+    pet, pet_time = load_cube(pet_cube_filename)
+
+    # Days available in both datasets, within the period
+    time, precip_index, pet_index = np.intersect1d(precip_time, pet_time, return_indices=True)
+    in_period = (time >= np.datetime64(f"{start_year}-01-01")) & (time < np.datetime64(f"{int(end_year) + 1}-01-01"))
+    years = time[in_period].astype("datetime64[Y]").astype(int) + 1970
+
+    _, annual_precip = calc_annual_sums(precip, precip_index[in_period], years)
+    _, annual_pet = calc_annual_sums(pet, pet_index[in_period], years)
+    # Precipitation flux in kg/m2/s to mm/d
+    annual_precip = annual_precip * 86400
+
+    # Calculate aridity index each year, and get the average values across the years
+    return calc_mean_annual_ratio(annual_precip, annual_pet)
+
+# The main function
 def main():
-        
+
     # %%
     # Read coordinate information
     file_path = os.path.join(data_dir, datarods_dir, "coord_info.csv")
@@ -68,28 +78,17 @@ def main():
     print('read coordinate info')
 
     # %%
-    # Initialize AI column
-    coord_info["AI"] = np.nan
+    print('Start calculating aridity index')
+    AI = calc_aridity_index()
+    print('End calculating aridity index')
 
-    # Convert the DataFrame to a list of tuples (each tuple is a row)
-    rows = [(index, row) for index, row in coord_info.iterrows()]
-    
-    # Setup the multiprocessing pool. You can specify the number of processes or
-    # leave it empty to use os.cpu_count()
-    pool = multiprocessing.Pool(processes=20)
-    print('Start multiprocessing')
-    # Use starmap to pass multiple arguments to the process_row function
-    results = list(tqdm(pool.starmap(process_row, rows), total=len(rows)))
-    print('End multiprocessing')
-
-    # Close the pool to free up resources
-    pool.close()
-    pool.join()
-    
-    # Update the DataFrame with the results from the multiprocessing
+    # Update the DataFrame with the results
     print('Start saving results')
-    for row_index, EASE_row_index, EASE_column_index, avg_AI in results:
-        coord_info.at[row_index, "AI"] = avg_AI
+    EASE_row_index = coord_info["EASE_row_index"].values
+    EASE_column_index = coord_info["EASE_column_index"].values
+    is_valid = (EASE_row_index >= 0) & (EASE_column_index >= 0)
+    coord_info["AI"] = np.nan
+    coord_info.loc[is_valid, "AI"] = AI[EASE_row_index[is_valid], EASE_column_index[is_valid]]
     print('End saving results')
 
     # Save the updated DataFrame
@@ -97,4 +96,4 @@ def main():
     coord_info.to_csv(filename, index=False)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
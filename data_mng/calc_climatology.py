@@ -0,0 +1,193 @@
+# %%
+# Per-pixel climatological statistics of the datarods variables, computed block by block over the EASE grid
+import numpy as np
+import pandas as pd
+import os
+from multiprocessing import Pool
+from functools import partial
+from tqdm import tqdm
+from transpose_datarods import load_cube, read_block, get_block_size
+from calc_aridityindex import calc_annual_sums, calc_mean_annual_ratio
+
+# Define configurations
+start_year = '2016'
+end_year = '2021'
+data_dir = r'/home/waves/projects/smap-drydown/data'
+datarods_dir = 'datarods'
+out_filename = "ancillary_climatology.csv"
+
+# Variables: on-disk (time, y, x) grids written by the datarods builders, and the factor to convert them to daily values
+variables = {
+    "precip": {"filename": os.path.join(data_dir, "SPL4SMGP", "SPL4SMGP_precipitation_total_surface_flux_EASEgrid.npy"), "scale": 86400},  # kg/m2/s to mm/d
+    "pet": {"filename": os.path.join(data_dir, "PET", "PET_EASEgrid.npy"), "scale": 1},
+}
+
+# Statistics to calculate: column name, type of statistic, variable, and the parameters of the statistic
+statistics = [
+    {"name": "MAP", "stat": "annual_sum", "variable": "precip"},
+    {"name": "MAPET", "stat": "annual_sum", "variable": "pet"},
+    {"name": "AI", "stat": "annual_sum_ratio", "variable": "precip", "denominator": "pet"},
+    {"name": "precip_{season}", "stat": "seasonal_sum", "variable": "precip"},
+    {"name": "pet_{season}", "stat": "seasonal_sum", "variable": "pet"},
+    {"name": "mean_precip", "stat": "mean", "variable": "precip"},
+    {"name": "mean_pet", "stat": "mean", "variable": "pet"},
+    {"name": "precip_q95", "stat": "quantile", "variable": "precip", "q": 0.95},
+    {"name": "wet_day_frequency", "stat": "wet_day_frequency", "variable": "precip", "threshold": 1.0},
+]
+
+seasons = {"DJF": [12, 1, 2], "MAM": [3, 4, 5], "JJA": [6, 7, 8], "SON": [9, 10, 11]}
+
+# %%
+def group_sum_mean(values, groups):
+    """Sum the values (pixel, time) by group of timesteps, and average the sums across the groups; NaN counts as zero.
+    NaN for all the pixels if there is no group (e.g., no full season in the period)"""
+    unique_groups = np.unique(groups)
+    if len(unique_groups) == 0:
+        return np.full(values.shape[0], np.nan)
+    sums = np.stack([np.nansum(values[:, groups == group], axis=1, dtype=np.float64) for group in unique_groups], axis=1)
+    return sums.mean(axis=1)
+
+
+def get_scale(stat, varname="variable"):
+    # The values are kept in their on-disk units (float32) and converted after the reduction
+    return variables[stat[varname]]["scale"]
+
+
+def calc_annual_sum(values, time, stat):
+    return group_sum_mean(values[stat["variable"]], time.year.values) * get_scale(stat)
+
+
+def calc_annual_sum_ratio(values, time, stat):
+    # Same computation as the AI of calc_aridityindex.py, on the (time, pixel) arrays of the block
+    years = time.year.values
+    time_index = np.arange(len(time))
+    _, annual_numerator = calc_annual_sums(values[stat["variable"]].T, time_index, years, time_chunk_size=max(len(time), 1))
+    _, annual_denominator = calc_annual_sums(values[stat["denominator"]].T, time_index, years, time_chunk_size=max(len(time), 1))
+    return calc_mean_annual_ratio(annual_numerator * get_scale(stat), annual_denominator * get_scale(stat, "denominator"))
+
+
+def get_full_seasons(season_year, month, months):
+    """Season-years with days in all the months of the season"""
+    season_months = np.unique(np.stack([season_year, month]), axis=1)
+    years, n_months = np.unique(season_months[0], return_counts=True)
+    return years[n_months == len(months)]
+
+
+def calc_seasonal_sum(values, time, stat):
+    # December counts towards the DJF season of the following year
+    season_year = time.year.values + (time.month.values == 12)
+    results = {}
+    for season, months in seasons.items():
+        in_season = np.isin(time.month.values, months)
+        # Partial seasons at the ends of the period (e.g., the first DJF without December) would bias the sums low
+        in_season &= np.isin(season_year, get_full_seasons(season_year[in_season], time.month.values[in_season], months))
+        results[stat["name"].format(season=season)] = group_sum_mean(values[stat["variable"]][:, in_season], season_year[in_season]) * get_scale(stat)
+    return results
+
+
+def calc_mean(values, time, stat):
+    return np.nanmean(values[stat["variable"]], axis=1, dtype=np.float64) * get_scale(stat)
+
+
+def calc_quantile(values, time, stat):
+    return np.nanquantile(values[stat["variable"]], stat["q"], axis=1).astype(np.float64) * get_scale(stat)
+
+
+def calc_wet_day_frequency(values, time, stat):
+    _values = values[stat["variable"]]
+    n_days = np.sum(~np.isnan(_values), axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sum(_values > stat["threshold"] / get_scale(stat), axis=1) / n_days
+
+
+stat_functions = {
+    "annual_sum": calc_annual_sum,
+    "annual_sum_ratio": calc_annual_sum_ratio,
+    "seasonal_sum": calc_seasonal_sum,
+    "mean": calc_mean,
+    "quantile": calc_quantile,
+    "wet_day_frequency": calc_wet_day_frequency,
+}
+
+
+def calc_block(rows, time, time_indices, column_indices, time_chunk_size):
+    """Calculate all the statistics for the pixels in a block of rows
+
+    Returns:
+        dict: column name -> (len(rows) * len(column_indices),) array of the statistic
+    """
+    y_start, y_end = rows.min(), rows.max() + 1
+    values = {}
+    for varname, variable in variables.items():
+        # Pixel-major (y, x, time) block, then flattened to (pixel, time) for the requested pixels
+        block = read_block(variable["filename"], y_start, y_end, time_chunk_size)
+        block = block[rows - y_start][:, column_indices][..., time_indices[varname]]
+        values[varname] = block.reshape(-1, block.shape[-1])
+
+    results = {}
+    for stat in statistics:
+        result = stat_functions[stat["stat"]](values, time, stat)
+        if isinstance(result, dict):
+            results.update(result)
+        else:
+            results[stat["name"]] = result
+    return results
+
+
+def calc_climatology(row_indices, column_indices, block_size=16, time_chunk_size=365, num_processes=6, max_block_bytes=512 * 1024**2):
+    """Calculate the statistics for all the pixels, block of rows by block of rows
+
+    Args:
+        row_indices (np.array): EASE row indices of the grid
+        column_indices (np.array): EASE column indices of the grid
+        block_size (int, optional): maximum number of rows processed at once. Defaults to 16.
+        time_chunk_size (int, optional): number of timesteps read at once. Defaults to 365.
+        num_processes (int, optional): number of worker processes. Defaults to 6.
+        max_block_bytes (int, optional): memory of the blocks of all the variables held by a worker at once; block_size is
+            lowered to fit it. Defaults to 512 MiB.
+
+    Returns:
+        pd.DataFrame: statistics indexed by EASE_row_index and EASE_column_index
+    """
+    # Days available for all the variables, within the period
+    times = {varname: load_cube(variable["filename"])[1] for varname, variable in variables.items()}
+    time = pd.DatetimeIndex(sorted(set.intersection(*[set(_time) for _time in times.values()])))
+    time = time[(time >= start_year) & (time < str(int(end_year) + 1))]
+    time_indices = {varname: np.searchsorted(_time, time.values) for varname, _time in times.items()}
+
+    # Split the rows into blocks of neighbouring rows
+    row_indices = np.unique(row_indices)
+    column_indices = np.unique(column_indices)
+    block_size = get_block_size({varname: variable["filename"] for varname, variable in variables.items()}, block_size, max_block_bytes)
+    blocks = [row_indices[(row_indices >= y_start) & (row_indices < y_start + block_size)] for y_start in range(row_indices.min(), row_indices.max() + 1, block_size)]
+    blocks = [rows for rows in blocks if len(rows) > 0]
+
+    _calc_block = partial(calc_block, time=time, time_indices=time_indices, column_indices=column_indices, time_chunk_size=time_chunk_size)
+    with Pool(num_processes) as pool:
+        results = list(tqdm(pool.imap(_calc_block, blocks), total=len(blocks)))
+
+    index = pd.MultiIndex.from_product([np.concatenate(blocks), column_indices], names=["EASE_row_index", "EASE_column_index"])
+    return pd.DataFrame({column: np.concatenate([result[column] for result in results]) for column in results[0]}, index=index)
+
+# The main function
+def main():
+
+    # %%
+    # Read coordinate information
+    file_path = os.path.join(data_dir, datarods_dir, "coord_info.csv")
+    coord_info = pd.read_csv(file_path)
+    coord_info = coord_info[(coord_info["EASE_row_index"] >= 0) & (coord_info["EASE_column_index"] >= 0)]
+    print('read coordinate info')
+
+    # %%
+    print('Start calculating climatology')
+    df = calc_climatology(row_indices=coord_info["EASE_row_index"].values, column_indices=coord_info["EASE_column_index"].values)
+    print('End calculating climatology')
+
+    # Save the statistics with the coordinates, as a single table indexed by the EASE indices
+    df = coord_info.set_index(["EASE_row_index", "EASE_column_index"])[["latitude", "longitude"]].join(df)
+    filename = os.path.join(data_dir, datarods_dir, out_filename)
+    df.to_csv(filename)
+
+if __name__ == "__main__":
+    main()
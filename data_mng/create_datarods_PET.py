@@ -15,11 +15,11 @@ from tqdm import tqdm
 
 # %% [markdown]
 # ## Read SMAP L4 data
-from rasterio.enums import Resampling
-from multiprocessing import Pool
 # %% [markdown]
 # # Configuration
-from itertools import product
+from transpose_datarods import write_datarods, save_time
+from regrid import Regridder
+from ease_grid import EASEgrid_template
 
 # %%
 data_dir = r"/home/waves/projects/smap-drydown/data"
@@ -40,66 +40,19 @@ def create_output_dir(out_dir):
         print(f"created {out_dir}")
     return out_dir
 
-def create_datarods(y_i, x_j, ds, out_dir, data_variable, variables_to_drop=['spatial_ref']):
-    try:
-        df = ds.isel(x=x_j, y=y_i).to_dataframe().drop(variables_to_drop, axis=1)
-        filename = f'{data_variable}_{y_i:03}_{x_j:03}.csv'
-        df.to_csv(os.path.join(out_dir, filename))
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        
 def get_filepath(filename_pattern, directory):
     file_paths = glob.glob(os.path.join(directory, filename_pattern))
     print(f"{filename_pattern}: {len(file_paths)} ... {len(file_paths):.1f} yrs of data available")
     return file_paths
 
-class EASEgrid_template():
-    def __init__(self, data_dir):
-        self.data_dir = data_dir
-        self.row_index, self.column_index, self.longitude, self.latitude = self.get_grid_coordinate()
-        self.varname = "SPL3SMP"
-        self.timestep = 365
-        self.filenames = self.get_filepath()
-        self.data = self.get_template_dataset()
-        
-    def get_grid_coordinate(self):
-        SMAPL3_grid_sample = os.path.join(self.data_dir, r"SPL3SMP/SMAP_L3_SM_P_20150331_R18290_001.h5")
-
-        # %%
-        ncf = netCDF4.Dataset(SMAPL3_grid_sample, diskless=True, persist=False)
-        nch_am = ncf.groups.get('Soil_Moisture_Retrieval_Data_AM')
-        nch_pm = ncf.groups.get('Soil_Moisture_Retrieval_Data_PM')
-
-        # %%
-        # Return as regular numpy array rather than masked array
-        _latitude = ma.getdata(nch_am.variables['latitude'][:].filled(fill_value=np.nan), subok=True)
-        _longitude = ma.getdata(nch_am.variables['longitude'][:].filled(fill_value=np.nan), subok=True)
-        _EASE_column_index = ma.getdata(nch_am.variables['EASE_column_index'][:].astype(int).filled(fill_value=-1), subok=True)
-        _EASE_row_index = ma.getdata(nch_am.variables['EASE_row_index'][:].astype(int).filled(fill_value=-1), subok=True)
-
-        # %%
-        # Coordinates with no data are skipped --- fill them
-        latitude = np.nanmax(_latitude, axis=1)
-        EASE_row_index = np.nanmax(_EASE_row_index, axis=1)
-        longitude = np.nanmax(_longitude, axis=0)
-        EASE_column_index = np.nanmax(_EASE_column_index, axis=0)
-        
-        return EASE_row_index, EASE_column_index, longitude, latitude
-    
-    def get_filepath(self):
-        filepaths = get_filepath(filename_pattern = f'SMAP_L3_SM_P_*.h5', directory=f"{data_dir}/{self.varname}")
-        return filepaths
-    
-    def get_template_dataset(self):
-        _ds_SMAPL3 = xr.open_dataset(self.filenames[0], engine='rasterio', group='Soil_Moisture_Retrieval_Data_AM', variable=['soil_moisture'])
-        ds_SMAPL3_coord_template = _ds_SMAPL3.assign_coords({'x':self.longitude, 'y':self.latitude}).rio.write_crs("epsg:4326")
-        return ds_SMAPL3_coord_template
-
 class PET():
     def __init__(self, data_dir):
         self.varname = "PET"
         self.filenames = self.get_filepath(data_dir)
         self.out_dir = create_output_dir(os.path.join(data_dir, datarods_dir, self.varname))
+        # On-disk (time, y, x) array of the PET data interpolated to the EASE grid
+        self.cube_filename = os.path.join(data_dir, self.varname, f"{self.varname}_EASEgrid.npy")
+        self.regrid_weights_dir = os.path.join(data_dir, self.varname, "regrid_weights")
         
     def get_filepath(self, data_dir):
         file_paths = get_filepath(filename_pattern=f'*_daily_pet.nc', directory=os.path.join(data_dir, self.varname))
@@ -108,34 +61,54 @@ class PET():
     def read_data(self, resample_target=None):
         print(f"Start reading dataset")
 
-        for filename in tqdm(self.filenames):
+        # Get the timestamps of each file first, to preallocate the array on disk
+        filenames = []
+        times = []
+        for filename in self.filenames:
             try:
-                _ds = xr.open_dataset(filename)
-
-                # The dataset is huge, resample before stacking
-                _ds = _ds.rename({'longitude':'x', 'latitude':'y'})
-                _ds.rio.write_crs('epsg:4326', inplace=True)
-                _ds_resampled = _ds.pet.interp_like(resample_target, method='linear', kwargs={'fill_value': np.nan})
-                
-                # Stacking data
-                if 'ds' in locals():
-                    ds = xr.concat([ds, _ds_resampled], dim="time")
-                else:
-                    ds = _ds_resampled
-                    
+                with xr.open_dataset(filename) as _ds:
+                    times.append(_ds.time.values)
+                filenames.append(filename)
             except Exception as e:
                 print(f"An error occurred: {e}")
                 continue
-                
+
+        # Write the files in chronological order
+        order = np.argsort([_time.min() for _time in times])
+        filenames = [filenames[i] for i in order]
+        times = [times[i] for i in order]
+
+        self.time = np.concatenate(times)
+        self.x = resample_target.x.values
+        self.y = resample_target.y.values
+        data = np.lib.format.open_memmap(self.cube_filename, mode='w+', dtype=np.float32, shape=(len(self.time), len(self.y), len(self.x)))
+
+        # Interpolate one file at a time and write it into its time slice, so that only one file is held in memory
+        i_start = 0
+        for filename, _time in zip(tqdm(filenames), times):
+            i_end = i_start + len(_time)
+            try:
+                with xr.open_dataset(filename) as _ds:
+                    _ds = _ds.rename({'longitude':'x', 'latitude':'y'})
+                    _ds.rio.write_crs('epsg:4326', inplace=True)
+                    # The weights are computed for the first file and read from the cache for the others
+                    regridder = Regridder(_ds.x.values, _ds.y.values, self.x, self.y, method='linear', cache_dir=self.regrid_weights_dir)
+                    _ds_resampled = regridder.regrid(_ds.pet)
+                    data[i_start:i_end] = _ds_resampled.transpose('time', 'y', 'x').values
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                data[i_start:i_end] = np.nan
+            i_start = i_end
+
+        data.flush()
+        del data
+        save_time(self.cube_filename, self.time)
         print(f"End reading dataset")
-        
-        ds = ds.sortby('time')
-        self.data = ds
-        return ds
     
-    def create_datarods(self, y_i, x_j):
-        print(f"Processing: {y_i}, {x_j}")
-        create_datarods(y_i=y_i, x_j=x_j, ds=self.data, out_dir=self.out_dir, data_variable=self.varname, variables_to_drop=['spatial_ref'])
+    def create_datarods(self, row_indices=None, column_indices=None, num_processes=6):
+        print(f"Start creating datarods")
+        write_datarods(cube_filenames={'pet': self.cube_filename}, time=self.time, x=self.x, y=self.y, out_dir=self.out_dir, varname=self.varname, row_indices=row_indices, column_indices=column_indices, num_processes=num_processes)
+        print(f"End creating datarods")
 
 
 def main():
@@ -144,11 +117,7 @@ def main():
     pet = PET(data_dir=data_dir)
     pet.read_data(resample_target=easegrid_template.data)
     
-    # Create a multiprocessing Pool
-    num_processes = 6
-    with Pool(num_processes) as pool:
-        for _ in tqdm(pool.starmap(pet.create_datarods, product(easegrid_template.row_index, easegrid_template.column_index))):
-            pass
+    pet.create_datarods(row_indices=easegrid_template.row_index, column_indices=easegrid_template.column_index, num_processes=6)
 
 if __name__ == "__main__":
     main()
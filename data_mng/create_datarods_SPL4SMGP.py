@@ -10,6 +10,11 @@ import os
 from datetime import datetime
 import glob
 from tqdm import tqdm
+from functools import lru_cache
+from multiprocessing import Pool
+from collections import defaultdict
+from regrid import Regridder
+from ease_grid import get_grid_coordinate, EASEgrid_template
 
 # %% [markdown]
 # # Configuration
@@ -21,81 +26,46 @@ datarods_dir = "datarods"
 SMAPL4_dir = "SPL4SMGP"
 SMAPL4_grid_dir = "SMAPL4SMGP_EASEreference"
 PET_dir = "PET"
-SMAPL3_grid_sample = os.path.join(data_dir, r"SPL3SMP/SMAP_L3_SM_P_20150331_R18290_001.h5")
+SMAPL4_template_fn = rf"{data_dir}/{SMAPL4_dir}/SMAP_L4_SM_gph_20180911T103000_Vv7032_001_HEGOUT.nc"
+SMAPL4_daily_dir = os.path.join(data_dir, SMAPL4_dir, "daily")
+num_processes = 6
 
 # %% [markdown]
-# # Investigate netCDF4 file
-
-# %%
-ncf = netCDF4.Dataset(SMAPL3_grid_sample, diskless=True, persist=False)
-nch_am = ncf.groups.get('Soil_Moisture_Retrieval_Data_AM')
-nch_pm = ncf.groups.get('Soil_Moisture_Retrieval_Data_PM')
-
-# %%
-nch_am.variables
-
-# %%
-nch_pm.variables
+# # Process SMAP L4 precip data
 
 # %% [markdown]
-# # Prepare geocoordinate matrix 
-
-# %%
-# Return as regular numpy array rather than masked array
-_latitude = ma.getdata(nch_am.variables['latitude'][:].filled(fill_value=np.nan), subok=True)
-_longitude = ma.getdata(nch_am.variables['longitude'][:].filled(fill_value=np.nan), subok=True)
-_EASE_column_index = ma.getdata(nch_am.variables['EASE_column_index'][:].astype(int).filled(fill_value=-1), subok=True)
-_EASE_row_index = ma.getdata(nch_am.variables['EASE_row_index'][:].astype(int).filled(fill_value=-1), subok=True)
-
-# %%
-# Coordinates with no data are skipped --- fill them
-latitude = np.nanmax(_latitude, axis=1)
-EASE_row_index = np.nanmax(_EASE_row_index, axis=1)
-longitude = np.nanmax(_longitude, axis=0)
-EASE_column_index = np.nanmax(_EASE_column_index, axis=0)
-
-# %%
-coord_info_column = pd.DataFrame({"latitude":latitude, "EASE_column_index":EASE_row_index})
-coord_info_row = pd.DataFrame({"longitude":longitude, "EASE_row_index":EASE_column_index})
-coord_info_column.to_csv(os.path.join(data_dir, 'coord_info_unique_column.csv'), index=False)
-coord_info_row.to_csv(os.path.join(data_dir, 'coord_info_unique_row.csv'),  index=False)
-coord_info = coord_info_row.assign(key=1).merge(coord_info_column.assign(key=1), on='key').drop('key', axis=1)
-coord_info.index.name = 'id'
-coord_info.to_csv(os.path.join(data_dir, 'coord_info.csv'))
-
-# %%
-# Get a list of files 
-SMAPL3_fn_pattern = f'SMAP_L3_SM_P_*.h5'
-SMAPL3_file_paths = glob.glob(rf'{data_dir}/{SMAPL3_dir}/{SMAPL3_fn_pattern}')
-print(f"{SMAPL3_fn_pattern}: {len(SMAPL3_file_paths)} ... {len(SMAPL3_file_paths)/365:.1f} yrs of data available")
+# ## Read SMAP L4 data
+# The grids and the regridder are built once per process (the main process and each worker), on first use
+@lru_cache(maxsize=1)
+def get_SMAPL4_template():
+    return xr.open_dataset(SMAPL4_template_fn)
 
-# %%
-_ds_SMAPL3 = xr.open_dataset(SMAPL3_file_paths[0], engine='rasterio', group='Soil_Moisture_Retrieval_Data_AM', variable=['soil_moisture'])
-ds_SMAPL3_coord_template = _ds_SMAPL3.assign_coords({'x':longitude, 'y':latitude}).rio.write_crs("epsg:4326")
-ds_SMAPL3_coord_template
+@lru_cache(maxsize=1)
+def get_SMAPL3_coord_template():
+    return EASEgrid_template(data_dir).data
 
-# %% [markdown]
-# # Process SMAP L4 precip data
+@lru_cache(maxsize=1)
+def get_regridder():
+    # The weights are computed once and read from the cache afterwards
+    SMAPL4_template = get_SMAPL4_template()
+    ds_SMAPL3_coord_template = get_SMAPL3_coord_template()
+    return Regridder(SMAPL4_template['x'].values, SMAPL4_template['y'].values*(-1), ds_SMAPL3_coord_template.x.values, ds_SMAPL3_coord_template.y.values, method='linear', cache_dir=os.path.join(data_dir, SMAPL4_dir, "regrid_weights"))
 
-# %% [markdown]
-# ## Read SMAP L4 data
-from rasterio.enums import Resampling
-SMAPL4_template_fn = rf"{data_dir}/{SMAPL4_dir}/SMAP_L4_SM_gph_20180911T103000_Vv7032_001_HEGOUT.nc"
-SMAPL4_template = xr.open_dataset(SMAPL4_template_fn)
 # %%
 def preprocess_SMAPL4(ds):
-    # Assign missing time dimension
+    # Assign missing time dimension: the middle of the 3-hourly window of the granule
     startTime = datetime.strptime(ds.rangeBeginningDateTime.split(".")[0], '%Y-%m-%dT%H:%M:%S')
     endTime = datetime.strptime(ds.rangeEndingDateTime.split(".")[0], '%Y-%m-%dT%H:%M:%S')
-    midTime = startTime + (startTime - endTime)/2
+    midTime = startTime + (endTime - startTime)/2
     ds = ds.assign_coords(time=midTime)
 
     # Reassign coordinates 
+    SMAPL4_template = get_SMAPL4_template()
     ds = ds.assign_coords(x=SMAPL4_template['x'][:], y=SMAPL4_template['y'][:]*(-1))
 
     # Resample according to SMAPL3 grid
     ds.rio.write_crs('epsg:4326', inplace=True)
-    ds = ds.sel(band=1).interp_like(ds_SMAPL3_coord_template, method='linear', kwargs={'fill_value': np.nan})
+    ds = get_regridder().regrid(ds.sel(band=1))
 
     # Fillnan 
     # _FillValue = _FillValue = 3.4028235e+38
@@ -106,43 +76,57 @@ def preprocess_SMAPL4(ds):
 # %%
 # chunks = {'x': 1200, 'y': 1200, 'time':1, 'band':1}
 SMAPL4_fn_pattern = f'SMAP_L4_SM_gph_*.nc'
-SMAPL4_file_paths = glob.glob(rf'{data_dir}/{SMAPL4_dir}/{SMAPL4_fn_pattern}')
-print(f"{SMAPL4_fn_pattern}: {len(SMAPL4_file_paths)} ... {len(SMAPL4_file_paths)/6/365:.1f} yrs of data available")
 # file_path = r"G:\Araki\SMSigxSMAP\1_data\SPL4SMGP\SMAP_L4_SM_gph_20150331T013000_Vv7032_001_HEGOUT.nc"
 # ds_SMAPL4_3hrly = xr.open_mfdataset(file_path, group='Geophysical_Data', engine="rasterio", preprocess=preprocess_SMAPL4, chunks=chunks)
 # ds_SMAPL4_3hrly
 # ds_SMAPL4_3hrly = xr.open_mfdataset(SMAPL4_file_paths, group='Geophysical_Data', engine="rasterio", preprocess=preprocess_SMAPL4, chunks=chunks)
 
 # %%
-# Get a list of files 
-# Load dataset
+# Process one day at a time in parallel: read the 3-hourly granules of the day, resample them to the SMAPL3 grid, and average them to daily.
+# Each day is saved to its own file, so that an interrupted run resumes from the days not processed yet
 import warnings
 warnings.filterwarnings("ignore")
-for filename in tqdm(SMAPL4_file_paths):
-    try:
-        _ds_SMAPL4 = xr.open_dataset(filename, group='Geophysical_Data', engine="rasterio")
-        _ds_SMAPL4 = preprocess_SMAPL4(_ds_SMAPL4)
-        if 'ds_SMAPL4' in locals():
-            ds_SMAPL4 = xr.concat([ds_SMAPL4, _ds_SMAPL4], dim="time")
-        else:
-            ds_SMAPL4 = _ds_SMAPL4
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        continue
-# Cannot use open_mfdataset --- can't skip if there is error also reproject_match have too much issues 
 
-# %%
-# Re-assign x and y coordinates
+def get_mid_time(filename):
+    # The timestamp in the filename is the middle of the 3-hourly window of the granule (the midTime assigned in preprocess_SMAPL4),
+    # e.g., 10:30 for SMAP_L4_SM_gph_20180911T103000_Vv7032_001_HEGOUT.nc, averaged over 09:00-12:00
+    return datetime.strptime(os.path.basename(filename).split("_")[4], '%Y%m%dT%H%M%S')
+
+def get_date(filename):
+    # Granules are grouped into days by their midTime
+    return get_mid_time(filename).replace(hour=0, minute=0, second=0)
+
+def get_daily_filename(date):
+    return os.path.join(SMAPL4_daily_dir, f'{SMAPL4_dir}_{date:%Y%m%d}.npz')
+
+def process_day(date_and_filenames):
+    date, filenames = date_and_filenames
+    _ds_SMAPL4_list = []
+    for filename in filenames:
+        try:
+            _ds_SMAPL4 = preprocess_SMAPL4(xr.open_dataset(filename, group='Geophysical_Data', engine="rasterio"))
+            if pd.Timestamp(_ds_SMAPL4.time.values).normalize() != pd.Timestamp(date):
+                print(f"Skipped {filename}: its midTime {_ds_SMAPL4.time.values} is not on {date:%Y-%m-%d}")
+                continue
+            _ds_SMAPL4_list.append(_ds_SMAPL4)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            continue
+    if not _ds_SMAPL4_list:
+        return None
+
+    ds_SMAPL4_daily = xr.concat(_ds_SMAPL4_list, dim="time").mean(dim="time", skipna=True, keep_attrs=True)
+    daily_data = {varname: ds_SMAPL4_daily[varname].transpose('y', 'x').values.astype(np.float32) for varname in ds_SMAPL4_daily.data_vars if set(ds_SMAPL4_daily[varname].dims) == {'y', 'x'}}
+
+    # Write to a temporary file first, so that a file of an interrupted day is never taken as done
+    daily_filename = get_daily_filename(date)
+    with open(f'{daily_filename}.tmp', 'wb') as f:
+        np.savez(f, **daily_data)
+    os.replace(f'{daily_filename}.tmp', daily_filename)
+    return date
 
-# Fill values 
-# Skip this because this is potentially too much computation
-# _FillValue = 3.4028235e+38 # ds_SMAPL4_3hrly.precipitation_total_surface_flux._FillValue
-# ds_SMAPL4_3hrly = ds_SMAPL4_3hrly.where(ds_SMAPL4_3hrly.precipitation_total_surface_flux != _FillValue, np.nan)
+# Cannot use open_mfdataset --- can't skip if there is error also reproject_match have too much issues 
 
-# Resample to daily
-print("Start resampling")
-ds_SMAPL4_daily = ds_SMAPL4.resample(time='D', skipna=True, keep_attrs=True).mean()
-print("Done resampling")
 # %%
 # ds_SMAPL4_daily
 # %% [markdown]
@@ -177,23 +161,75 @@ print("Done resampling")
 # %% [markdown]
 # ## Create datarods
 
-# %%
-# Create and save the datarods  
-out_dir = os.path.join(data_dir, datarods_dir, SMAPL4_dir)
-if not os.path.exists(out_dir):
-    os.makedirs(out_dir)
-
-from itertools import product
-print("CREATING SMAPL4 DATARODS")
-for y_i, x_j in tqdm(product(EASE_row_index, EASE_column_index)):
-    try:
-        df_SMAPL4 = ds_SMAPL4_daily.isel(x=x_j, y=y_i).to_dataframe().drop(['band','projection_information'], axis=1)
-        filename = f'{SMAPL4_dir}_{y_i:03}_{x_j:03}.csv'
-        df_SMAPL4.to_csv(os.path.join(out_dir, filename))
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        continue
-
 
+# %%
 
 # %%
+def main():
+    # Prepare geocoordinate matrix
+    # Read once from the sample SMAPL3 file, then from the saved grid file
+    EASE_row_index, EASE_column_index, longitude, latitude = get_grid_coordinate(data_dir)
+    coord_info_column = pd.DataFrame({"latitude":latitude, "EASE_column_index":EASE_row_index})
+    coord_info_row = pd.DataFrame({"longitude":longitude, "EASE_row_index":EASE_column_index})
+    coord_info_column.to_csv(os.path.join(data_dir, 'coord_info_unique_column.csv'), index=False)
+    coord_info_row.to_csv(os.path.join(data_dir, 'coord_info_unique_row.csv'),  index=False)
+    coord_info = coord_info_row.assign(key=1).merge(coord_info_column.assign(key=1), on='key').drop('key', axis=1)
+    coord_info.index.name = 'id'
+    coord_info.to_csv(os.path.join(data_dir, 'coord_info.csv'))
+    ds_SMAPL3_coord_template = get_SMAPL3_coord_template()
+
+    # Process SMAP L4 data, one day per task
+    if not os.path.exists(SMAPL4_daily_dir):
+        os.makedirs(SMAPL4_daily_dir)
+    SMAPL4_file_paths = glob.glob(rf'{data_dir}/{SMAPL4_dir}/{SMAPL4_fn_pattern}')
+    print(f"{SMAPL4_fn_pattern}: {len(SMAPL4_file_paths)} ... {len(SMAPL4_file_paths)/6/365:.1f} yrs of data available")
+    SMAPL4_file_paths_by_date = defaultdict(list)
+    for filename in SMAPL4_file_paths:
+        SMAPL4_file_paths_by_date[get_date(filename)].append(filename)
+    dates_to_process = [date for date in sorted(SMAPL4_file_paths_by_date) if not os.path.exists(get_daily_filename(date))]
+    print(f"{len(SMAPL4_file_paths_by_date) - len(dates_to_process)} days already processed, {len(dates_to_process)} days to process")
+
+    with Pool(num_processes) as pool:
+        for _ in tqdm(pool.imap_unordered(process_day, [(date, SMAPL4_file_paths_by_date[date]) for date in dates_to_process]), total=len(dates_to_process)):
+            pass
+
+    # Create and save the datarods  
+    out_dir = os.path.join(data_dir, datarods_dir, SMAPL4_dir)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    print("CREATING SMAPL4 DATARODS")
+    from transpose_datarods import write_datarods, save_time
+    # Stack the daily files into on-disk (time, y, x) grids, then transpose the grids to datarods block by block
+    # Days without data are filled with NaN, to keep a regular daily time axis
+    SMAPL4_processed_dates = [date for date in sorted(SMAPL4_file_paths_by_date) if os.path.exists(get_daily_filename(date))]
+    SMAPL4_dates = pd.date_range(SMAPL4_processed_dates[0], SMAPL4_processed_dates[-1], freq='D')
+    with np.load(get_daily_filename(SMAPL4_processed_dates[0])) as _daily_data:
+        SMAPL4_varnames = list(_daily_data.keys())
+        grid_shape = _daily_data[SMAPL4_varnames[0]].shape
+
+    cube_filenames = {}
+    cubes = {}
+    for varname in SMAPL4_varnames:
+        cube_filenames[varname] = os.path.join(data_dir, SMAPL4_dir, f'{SMAPL4_dir}_{varname}_EASEgrid.npy')
+        cubes[varname] = np.lib.format.open_memmap(cube_filenames[varname], mode='w+', dtype=np.float32, shape=(len(SMAPL4_dates), *grid_shape))
+
+    for i, date in enumerate(tqdm(SMAPL4_dates)):
+        daily_filename = get_daily_filename(date)
+        if not os.path.exists(daily_filename):
+            for varname in SMAPL4_varnames:
+                cubes[varname][i] = np.nan
+            continue
+        with np.load(daily_filename) as _daily_data:
+            for varname in SMAPL4_varnames:
+                cubes[varname][i] = _daily_data[varname]
+
+    for varname, cube in cubes.items():
+        cube.flush()
+        save_time(cube_filenames[varname], SMAPL4_dates.values)
+    del cubes
+
+    write_datarods(cube_filenames=cube_filenames, time=SMAPL4_dates.values, x=ds_SMAPL3_coord_template.x.values, y=ds_SMAPL3_coord_template.y.values, out_dir=out_dir, varname=SMAPL4_dir, row_indices=EASE_row_index, column_indices=EASE_column_index)
+
+if __name__ == "__main__":
+    main()
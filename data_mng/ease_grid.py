@@ -0,0 +1,75 @@
+# %%
+# The 36km EASE grid of SMAP L3, shared by the datarods builders
+import numpy as np
+import numpy.ma as ma
+import xarray as xr
+import rioxarray
+import netCDF4
+import os
+from functools import lru_cache
+
+SMAPL3_grid_sample_filename = r"SPL3SMP/SMAP_L3_SM_P_20150331_R18290_001.h5"
+# Saved next to coord_info.csv; also read by analysis/SMAPgrid.py
+EASE_grid_filename = r"datarods/EASE_grid_36km.npz"
+
+
+def read_grid_coordinate(data_dir):
+    """Read the EASE grid coordinates and indices from a sample SMAP L3 file"""
+    SMAPL3_grid_sample = os.path.join(data_dir, SMAPL3_grid_sample_filename)
+
+    ncf = netCDF4.Dataset(SMAPL3_grid_sample, diskless=True, persist=False)
+    nch_am = ncf.groups.get("Soil_Moisture_Retrieval_Data_AM")
+
+    # Return as regular numpy array rather than masked array
+    _latitude = ma.getdata(nch_am.variables["latitude"][:].filled(fill_value=np.nan), subok=True)
+    _longitude = ma.getdata(nch_am.variables["longitude"][:].filled(fill_value=np.nan), subok=True)
+    _EASE_column_index = ma.getdata(nch_am.variables["EASE_column_index"][:].astype(int).filled(fill_value=-1), subok=True)
+    _EASE_row_index = ma.getdata(nch_am.variables["EASE_row_index"][:].astype(int).filled(fill_value=-1), subok=True)
+    ncf.close()
+
+    # Coordinates with no data are skipped --- fill them
+    latitude = np.nanmax(_latitude, axis=1)
+    EASE_row_index = np.nanmax(_EASE_row_index, axis=1)
+    longitude = np.nanmax(_longitude, axis=0)
+    EASE_column_index = np.nanmax(_EASE_column_index, axis=0)
+
+    return EASE_row_index, EASE_column_index, longitude, latitude
+
+
+@lru_cache(maxsize=None)
+def get_grid_coordinate(data_dir):
+    """Get the EASE grid coordinates and indices; read from the sample SMAP L3 file once, then from the saved grid file
+
+    Args:
+        data_dir (str): data directory
+
+    Returns:
+        tuple: EASE_row_index, EASE_column_index, longitude, latitude
+    """
+    filename = os.path.join(data_dir, EASE_grid_filename)
+    if os.path.exists(filename):
+        with np.load(filename) as grid:
+            return grid["EASE_row_index"], grid["EASE_column_index"], grid["longitude"], grid["latitude"]
+
+    EASE_row_index, EASE_column_index, longitude, latitude = read_grid_coordinate(data_dir)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Per-process temporary file: several builders may save the grid at once
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "wb") as f:
+        np.savez(f, EASE_row_index=EASE_row_index, EASE_column_index=EASE_column_index, longitude=longitude, latitude=latitude)
+    os.replace(tmp_filename, filename)
+    print(f"Saved the EASE grid to {filename}")
+    return EASE_row_index, EASE_column_index, longitude, latitude
+
+
+class EASEgrid_template:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.row_index, self.column_index, self.longitude, self.latitude = get_grid_coordinate(data_dir)
+        self.data = self.get_template_dataarray()
+
+    def get_template_dataarray(self):
+        """Get the template dataarray with nan data on the EASE grid coordinates"""
+        _data = np.full((len(self.latitude), len(self.longitude)), np.nan, dtype=np.float32)
+        da = xr.DataArray(_data, coords=[("y", self.latitude), ("x", self.longitude)], name="data")
+        return da.rio.write_crs("epsg:4326")
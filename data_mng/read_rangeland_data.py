@@ -8,12 +8,12 @@ import os
 from datetime import datetime
 import glob
 from tqdm import tqdm
-from rasterio.enums import Resampling
-from multiprocessing import Pool
-from itertools import product
-import rioxarray
+import rasterio
+from rasterio.windows import Window
 import time
 import re
+from regrid import Regridder
+from ease_grid import EASEgrid_template
 
 # Define config and functions
 data_dir = r"/home/waves/projects/smap-drydown/data"
@@ -38,131 +38,108 @@ def get_filepath_from_pattern(filename_pattern, directory):
     return file_paths
 
 
-#################################################
-# Get EASEgrid template from SMAP
-#################################################
+def get_block_windows(src, window_size=4096):
+    """Get windows of about window_size x window_size pixels, aligned to the internal blocks of the raster"""
+    block_height, block_width = src.block_shapes[0]
+    height = max(block_height, window_size // block_height * block_height)
+    width = max(block_width, window_size // block_width * block_width)
+    for row_off in range(0, src.height, height):
+        for col_off in range(0, src.width, width):
+            yield Window(
+                col_off,
+                row_off,
+                min(width, src.width - col_off),
+                min(height, src.height - row_off),
+            )
 
 
-class EASEgrid_template:
-    def __init__(self, data_dir):
-        self.data_dir = data_dir
-        self.row_index, self.column_index, self.longitude, self.latitude = (
-            self.get_grid_coordinate()
-        )
-        self.varname = "SPL3SMP"
-        self.timestep = 365
-        self.filenames = self.get_filepath()
-        self.data = self.get_template_dataset()
-
-    def get_grid_coordinate(self):
-        SMAPL3_grid_sample = os.path.join(
-            self.data_dir, r"SPL3SMP/SMAP_L3_SM_P_20150331_R18290_001.h5"
-        )
+def resample_raster(filename, ease_template, window_size=4096):
+    """Area-average all the bands of a raster to the EASE grid, reading one window at a time
 
-        ncf = netCDF4.Dataset(SMAPL3_grid_sample, diskless=True, persist=False)
-        nch_am = ncf.groups.get("Soil_Moisture_Retrieval_Data_AM")
-        nch_pm = ncf.groups.get("Soil_Moisture_Retrieval_Data_PM")
+    Args:
+        filename (str): GeoTIFF file in EPSG:4326
+        ease_template (xr.DataArray): EASE grid template
+        window_size (int, optional): approximate size of the windows read at once, in pixels. Defaults to 4096.
 
-        # Return as regular numpy array rather than masked array
-        _latitude = ma.getdata(
-            nch_am.variables["latitude"][:].filled(fill_value=np.nan), subok=True
-        )
-        _longitude = ma.getdata(
-            nch_am.variables["longitude"][:].filled(fill_value=np.nan), subok=True
-        )
-        _EASE_column_index = ma.getdata(
-            nch_am.variables["EASE_column_index"][:].astype(int).filled(fill_value=-1),
-            subok=True,
-        )
-        _EASE_row_index = ma.getdata(
-            nch_am.variables["EASE_row_index"][:].astype(int).filled(fill_value=-1),
-            subok=True,
-        )
+    Returns:
+        xr.DataArray: resampled data with band, y, x dimensions
+    """
+    with rasterio.open(filename) as src:
+        # Pixel centers
+        x = src.transform.c + (np.arange(src.width) + 0.5) * src.transform.a
+        y = src.transform.f + (np.arange(src.height) + 0.5) * src.transform.e
 
-        # Coordinates with no data are skipped --- fill them
-        latitude = np.nanmax(_latitude, axis=1)
-        EASE_row_index = np.nanmax(_EASE_row_index, axis=1)
-        longitude = np.nanmax(_longitude, axis=0)
-        EASE_column_index = np.nanmax(_EASE_column_index, axis=0)
-
-        return EASE_row_index, EASE_column_index, longitude, latitude
+        # Subset according to bbox
+        left, bottom, right, top = src.bounds
+        subset_ease_template = ease_template.sel(
+            x=slice(left, right), y=slice(top, bottom)
+        )
 
-    def get_filepath(self):
-        filepaths = get_filepath_from_pattern(
-            filename_pattern=f"SMAP_L3_SM_P_*.h5",
-            directory=f"{data_dir}/{self.varname}",
+        # Same weights for all bands; cached for the other years on the same grid
+        regridder = Regridder(
+            x,
+            y,
+            subset_ease_template.x.values,
+            subset_ease_template.y.values,
+            method="average",
+            cache_dir=os.path.join(data_dir, rangeland_dir, "regrid_weights"),
+        )
+        # Column slices of the weights, one per window
+        weights_x = regridder.weights_x.tocsc()
+        weights_y = regridder.weights_y.tocsc()
+        n_y, n_x = len(regridder.target_y), len(regridder.target_x)
+
+        weighted_sum = np.zeros((n_y, src.count * n_x))
+        for window in tqdm(list(get_block_windows(src, window_size))):
+            rows = slice(window.row_off, window.row_off + window.height)
+            cols = slice(window.col_off, window.col_off + window.width)
+            _weights_y = weights_y[:, rows]
+            _weights_x = weights_x[:, cols]
+            if _weights_y.nnz == 0 or _weights_x.nnz == 0:
+                continue
+
+            # All the bands at once, (band, y, x)
+            data = src.read(window=window)
+            # Fill values are taken as zero cover
+            data = np.where(data == src.nodata, 0, data).astype(np.float32)
+
+            # Along x: (target_x, x) @ (x, band * y)
+            _data = _weights_x @ data.transpose(2, 0, 1).reshape(window.width, -1)
+            # Along y: (target_y, y) @ (y, band * target_x)
+            _data = _data.reshape(n_x, src.count, window.height).transpose(2, 1, 0)
+            weighted_sum += _weights_y @ _data.reshape(window.height, -1)
+
+        # Every pixel has a value, so the total weight of a target cell is separable
+        total_weight = np.outer(
+            np.asarray(weights_y.sum(axis=1)).ravel(),
+            np.asarray(weights_x.sum(axis=1)).ravel(),
         )
-        return filepaths
-
-    def get_template_dataset(self):
-        _ds_SMAPL3 = xr.open_dataset(
-            self.filenames[0],
-            engine="rasterio",
-            group="Soil_Moisture_Retrieval_Data_AM",
-            variable=["soil_moisture"],
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resampled = weighted_sum.reshape(n_y, src.count, n_x) / total_weight[:, None, :]
+
+        return xr.DataArray(
+            resampled.transpose(1, 0, 2),
+            dims=("band", "y", "x"),
+            coords={
+                "band": np.arange(1, src.count + 1),
+                "y": regridder.target_y,
+                "x": regridder.target_x,
+            },
         )
-        ds_SMAPL3_coord_template = _ds_SMAPL3.assign_coords(
-            {"x": self.longitude, "y": self.latitude}
-        ).rio.write_crs("epsg:4326")
-        return ds_SMAPL3_coord_template
 
 
 def main():
 
     print("Resample rangeland data to SMAP L3 EASE grids")
 
-    # Execute
-    SMAPL3_grid_sample = os.path.join(
-        data_dir, r"SPL3SMP/SMAP_L3_SM_P_20150331_R18290_001.h5"
-    )
-    ncf = netCDF4.Dataset(SMAPL3_grid_sample, diskless=True, persist=False)
-    nch_am = ncf.groups.get("Soil_Moisture_Retrieval_Data_AM")
-    nch_pm = ncf.groups.get("Soil_Moisture_Retrieval_Data_PM")
-
-    # Return as regular numpy array rather than masked array
-    _latitude = ma.getdata(
-        nch_am.variables["latitude"][:].filled(fill_value=np.nan), subok=True
-    )
-    _longitude = ma.getdata(
-        nch_am.variables["longitude"][:].filled(fill_value=np.nan), subok=True
-    )
-    _EASE_column_index = ma.getdata(
-        nch_am.variables["EASE_column_index"][:].astype(int).filled(fill_value=-1),
-        subok=True,
-    )
-    _EASE_row_index = ma.getdata(
-        nch_am.variables["EASE_row_index"][:].astype(int).filled(fill_value=-1),
-        subok=True,
-    )
-
-    # Coordinates with no data are skipped --- fill them
-    latitude = np.nanmax(_latitude, axis=1)
-    EASE_row_index = np.nanmax(_EASE_row_index, axis=1)
-    longitude = np.nanmax(_longitude, axis=0)
-    EASE_column_index = np.nanmax(_EASE_column_index, axis=0)
-
-    filepaths = get_filepath_from_pattern(
-        filename_pattern=f"SMAP_L3_SM_P_*.h5", directory=f"{data_dir}/SPL3SMP"
-    )
-    _ds_SMAPL3 = xr.open_dataset(
-        filepaths[0],
-        engine="rasterio",
-        group="Soil_Moisture_Retrieval_Data_AM",
-        variable=["soil_moisture"],
-    )
-    ds_SMAPL3_coord_template = _ds_SMAPL3.assign_coords(
-        {"x": longitude, "y": latitude}
-    ).rio.write_crs("epsg:4326")
-    ease_template = (
-        ds_SMAPL3_coord_template.Soil_Moisture_Retrieval_Data_AM_soil_moisture
-    )
+    ease_template = EASEgrid_template(data_dir).data
 
     #################################################
     # Get rangeland data
     #################################################
 
     # Configs
-    out_dir = create_output_dir(os.path.join(data_dir, "rangeland_resampled_linear_v2"))
+    out_dir = create_output_dir(os.path.join(data_dir, "rangeland_resampled_average"))
 
     # Get original files
     filenames = get_filepath_from_pattern(
@@ -173,53 +150,22 @@ def main():
     print(filenames)
 
     for i, filename in enumerate(filenames):
-        # Open datasets
-        _ds = rioxarray.open_rasterio(filename)
-        ds = _ds.rio.write_crs("epsg:4326", inplace=True)
-
-        # Subset according to bbox
-        left, bottom, right, top = ds.rio.bounds()
-        subset_ease_template = ease_template.sel(
-            x=slice(left, right), y=slice(top, bottom)
-        )
-
         # Using regular expression to find year pattern in the string
         match = re.search(r"\d{4}", filename)
         record_year = match.group() if match else "Year not found"
 
-        # Loop through bands
-        for band_num in range(1, 7):  # This will loop from 1 to 6
-            # Select one vegetation type and start resample
-            _veg_ds = ds.sel(band=band_num)
-
-            # print(
-            #     f"Currently masking the data of Year {record_year} - band {band_num}"
-            # )
-            # start_time = time.time()
-            # veg_ds = veg_ds.where(veg_ds != veg_ds._FillValue, np.nan)
-            # end_time = time.time()
-            # elapsed_time = end_time - start_time
-            # print(
-            #     f"Finished masking the data of Year {record_year} - band {band_num}\nTime taken for the operation: {elapsed_time} seconds"
-            # )
-
-            print(
-                f"Currently resampling the data of Year {record_year} - band {band_num}"
-            )
-            start_time = time.time()
-            # veg_ds_resampled = veg_ds.rio.reproject_match(subset_ease_template, resampling=Resampling.average) # Somehow this didn't align with the coastline
-            veg_ds = _veg_ds.where(_veg_ds != _veg_ds._FillValue, 0)
-            veg_ds_resampled = veg_ds.interp_like(
-                subset_ease_template, method="linear", kwargs={"fill_value": np.nan}
-            )
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            print(
-                f"Finished resampling the data of Year {record_year} - band {band_num}\nTime taken for the operation: {elapsed_time} seconds"
-            )
+        print(f"Currently resampling the data of Year {record_year}")
+        start_time = time.time()
+        veg_ds_resampled = resample_raster(filename, ease_template)
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+        print(
+            f"Finished resampling the data of Year {record_year}\nTime taken for the operation: {elapsed_time} seconds"
+        )
 
+        for band_num in veg_ds_resampled.band.values:
             out_filepath = os.path.join(out_dir, f"{record_year}_band{band_num}.nc")
-            veg_ds_resampled.to_netcdf(path=out_filepath)
+            veg_ds_resampled.sel(band=band_num).to_netcdf(path=out_filepath)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+# %%
+# Regridding from a rectilinear lon/lat grid to the EASE grid with precomputed sparse weights
+import numpy as np
+import xarray as xr
+import scipy.sparse as sparse
+import hashlib
+import os
+
+
+def get_linear_weights(source, target):
+    """Get the 1D linear interpolation weights from the source to the target coordinates
+
+    Target coordinates outside the source coordinates get no weights (NaN after regridding), as in interp_like with fill_value=np.nan
+
+    Args:
+        source (np.array): source coordinates, ascending or descending
+        target (np.array): target coordinates
+
+    Returns:
+        sparse.csr_matrix: weights of shape (len(target), len(source))
+    """
+    order = np.argsort(source)
+    source_sorted = source[order]
+
+    i = np.searchsorted(source_sorted, target, side="right") - 1
+    # The target at the last source coordinate is interpolated from the last interval
+    i = np.where(target == source_sorted[-1], len(source) - 2, i)
+    valid = (i >= 0) & (i < len(source) - 1) & ~np.isnan(target)
+    rows = np.flatnonzero(valid)
+    i = i[valid]
+
+    w_upper = (target[valid] - source_sorted[i]) / (source_sorted[i + 1] - source_sorted[i])
+    return sparse.csr_matrix(
+        (
+            np.concatenate([1 - w_upper, w_upper]),
+            (np.concatenate([rows, rows]), np.concatenate([order[i], order[i + 1]])),
+        ),
+        shape=(len(target), len(source)),
+    )
+
+
+def get_cell_edges(centers):
+    """Get the cell edges of a coordinate from the cell centers, halfway between neighbouring centers"""
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate(
+        [[centers[0] - (midpoints[0] - centers[0])], midpoints, [centers[-1] + (centers[-1] - midpoints[-1])]]
+    )
+
+
+def get_average_weights(source, target):
+    """Get the 1D area-average weights from the source to the target coordinates
+
+    The weight of a source cell is the length of its overlap with the target cell
+
+    Args:
+        source (np.array): source cell centers, ascending or descending
+        target (np.array): target cell centers, ascending or descending
+
+    Returns:
+        sparse.csr_matrix: weights of shape (len(target), len(source))
+    """
+    source_edges = get_cell_edges(source)
+    target_edges = get_cell_edges(target)
+    source_lower = np.minimum(source_edges[:-1], source_edges[1:])
+    source_upper = np.maximum(source_edges[:-1], source_edges[1:])
+    target_lower = np.minimum(target_edges[:-1], target_edges[1:])
+    target_upper = np.maximum(target_edges[:-1], target_edges[1:])
+
+    # Source cells sorted by their lower edge, to search the candidates overlapping each target cell
+    order = np.argsort(source_lower)
+    first = np.searchsorted(source_upper[order], target_lower, side="right")
+    last = np.searchsorted(source_lower[order], target_upper, side="left")
+
+    rows, columns, weights = [], [], []
+    for row in range(len(target)):
+        candidates = order[first[row] : last[row]]
+        overlap = np.minimum(source_upper[candidates], target_upper[row]) - np.maximum(source_lower[candidates], target_lower[row])
+        overlapping = overlap > 0
+        rows.append(np.full(overlapping.sum(), row))
+        columns.append(candidates[overlapping])
+        weights.append(overlap[overlapping])
+
+    return sparse.csr_matrix(
+        (np.concatenate(weights), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(len(target), len(source)),
+    )
+
+
+class Regridder:
+    """Regrid data from a rectilinear source grid onto a rectilinear target grid (e.g., the EASE grid template)
+
+    The weights are separable in x and y; they are computed once per pair of grids, cached to disk, and applied to each
+    new field as two sparse matrix multiplications.
+    """
+
+    def __init__(self, source_x, source_y, target_x, target_y, method="linear", cache_dir=None):
+        """
+        Args:
+            source_x (np.array): x coordinates (longitude) of the source grid
+            source_y (np.array): y coordinates (latitude) of the source grid
+            target_x (np.array): x coordinates (longitude) of the target grid
+            target_y (np.array): y coordinates (latitude) of the target grid
+            method (str, optional): "linear" (bilinear interpolation, as interp_like) or "average" (area average). Defaults to "linear".
+            cache_dir (str, optional): directory to cache the weights. Defaults to None (not cached).
+        """
+        self.source_x = np.asarray(source_x, dtype=float)
+        self.source_y = np.asarray(source_y, dtype=float)
+        self.target_x = np.asarray(target_x, dtype=float)
+        self.target_y = np.asarray(target_y, dtype=float)
+        self.method = method
+        self.weights_x, self.weights_y = self.get_weights(cache_dir)
+
+    def get_key(self):
+        """Get the hash key of the source and target grids and the method"""
+        h = hashlib.sha256(self.method.encode())
+        for coord in (self.source_x, self.source_y, self.target_x, self.target_y):
+            h.update(np.ascontiguousarray(coord).tobytes())
+        return h.hexdigest()[:16]
+
+    def get_weights(self, cache_dir=None):
+        if cache_dir is not None:
+            cache_filename = os.path.join(cache_dir, f"regrid_weights_{self.method}_{self.get_key()}.npz")
+            if os.path.exists(cache_filename):
+                with np.load(cache_filename) as cache:
+                    return (
+                        sparse.csr_matrix((cache["x_data"], cache["x_indices"], cache["x_indptr"]), shape=cache["x_shape"]),
+                        sparse.csr_matrix((cache["y_data"], cache["y_indices"], cache["y_indptr"]), shape=cache["y_shape"]),
+                    )
+
+        if self.method == "linear":
+            weights_x = get_linear_weights(self.source_x, self.target_x)
+            weights_y = get_linear_weights(self.source_y, self.target_y)
+        elif self.method == "average":
+            weights_x = get_average_weights(self.source_x, self.target_x)
+            weights_y = get_average_weights(self.source_y, self.target_y)
+        else:
+            raise ValueError(f"Unknown regridding method: {self.method}")
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Per-process temporary file: the workers of a pool may build the same weights at once
+            tmp_filename = f"{cache_filename}.{os.getpid()}.tmp"
+            with open(tmp_filename, "wb") as f:
+                np.savez(
+                    f,
+                    **{
+                        f"{axis}_{attr}": getattr(weights, attr) if attr != "shape" else np.array(weights.shape)
+                        for axis, weights in (("x", weights_x), ("y", weights_y))
+                        for attr in ("data", "indices", "indptr", "shape")
+                    },
+                )
+            os.replace(tmp_filename, cache_filename)
+
+        return weights_x, weights_y
+
+    def regrid_array(self, data):
+        """Regrid a numpy array of shape (..., y, x) to (..., target_y, target_x)"""
+        data = np.asarray(data, dtype=float)
+        leading_shape = data.shape[:-2]
+        n_y, n_x = data.shape[-2:]
+
+        if self.method == "linear":
+            values = data
+        else:
+            # Area average over the valid source cells only
+            is_valid = ~np.isnan(data)
+            values = np.where(is_valid, data, 0)
+
+        def apply(values):
+            # Along x: (..., y, x) @ (x, target_x)
+            _values = (self.weights_x @ values.reshape(-1, n_x).T).T.reshape(*leading_shape, n_y, -1)
+            # Along y: (target_y, y) @ (y, ...)
+            _values = np.moveaxis(_values, -2, 0)
+            _values = (self.weights_y @ _values.reshape(n_y, -1)).reshape(-1, *_values.shape[1:])
+            return np.moveaxis(_values, 0, -2)
+
+        regridded = apply(values)
+        if self.method == "average":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                regridded = regridded / apply(is_valid.astype(float))
+
+        # Target cells without any source cell
+        no_weights = np.add.outer(self.weights_y.getnnz(axis=1) == 0, self.weights_x.getnnz(axis=1) == 0)
+        regridded[..., no_weights] = np.nan
+        return regridded
+
+    def regrid(self, ds):
+        """Regrid the variables of a DataArray or Dataset with y and x dimensions onto the target grid
+
+        Args:
+            ds (xr.DataArray or xr.Dataset): data with y and x dimensions, and the source grid coordinates
+
+        Returns:
+            xr.DataArray or xr.Dataset: regridded data with the target grid coordinates
+        """
+        if isinstance(ds, xr.Dataset):
+            return ds.map(lambda da: self.regrid(da) if {"y", "x"} <= set(da.dims) else da, keep_attrs=True).assign_coords(
+                x=self.target_x, y=self.target_y
+            )
+
+        dims = ds.dims
+        da = ds.transpose(..., "y", "x")
+        regridded = self.regrid_array(da.values)
+        coords = {name: coord for name, coord in da.coords.items() if not {"y", "x"} & set(coord.dims)}
+        coords.update({"y": self.target_y, "x": self.target_x})
+        return xr.DataArray(regridded, dims=da.dims, coords=coords, attrs=da.attrs, name=da.name).transpose(*dims)
@@ -0,0 +1,134 @@
+# %%
+# Blocked transpose from daily (time, y, x) grids to pixel-wise datarods
+import numpy as np
+import pandas as pd
+import os
+from multiprocessing import Pool
+from functools import partial
+from tqdm import tqdm
+
+
+def get_time_filename(cube_filename):
+    """Get the file of the timestamps of an on-disk grid, saved next to it"""
+    return f"{os.path.splitext(cube_filename)[0]}_time.npy"
+
+
+def save_time(cube_filename, time):
+    """Save the timestamps of an on-disk grid"""
+    np.save(get_time_filename(cube_filename), np.asarray(time, dtype="datetime64[ns]"))
+
+
+def load_cube(cube_filename):
+    """Open an on-disk (time, y, x) grid as a read-only memory map, with its timestamps"""
+    return np.load(cube_filename, mmap_mode="r"), np.load(get_time_filename(cube_filename))
+
+
+def save_cube(da, filename, time_chunk_size=365):
+    """Write a (time, y, x) DataArray to an on-disk .npy array, one time chunk at a time
+
+    Args:
+        da (xr.DataArray): data with time, y, x dimensions
+        filename (str): output .npy file
+        time_chunk_size (int, optional): number of timesteps loaded at once. Defaults to 365.
+    """
+    da = da.transpose("time", "y", "x")
+    cube = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float32, shape=da.shape)
+    for t_start in range(0, da.sizes["time"], time_chunk_size):
+        t_end = t_start + time_chunk_size
+        cube[t_start:t_end] = da.isel(time=slice(t_start, t_end)).values
+    cube.flush()
+    del cube
+    save_time(filename, da.time.values)
+
+
+def read_block(cube_filename, y_start, y_end, time_chunk_size):
+    """Read the rows [y_start, y_end) of a (time, y, x) .npy array and return them pixel-major as (y, x, time)"""
+    cube = np.load(cube_filename, mmap_mode="r")
+    n_time, _, n_x = cube.shape
+    block = np.empty((y_end - y_start, n_x, n_time), dtype=cube.dtype)
+    # Each time chunk is a contiguous read of full rows
+    for t_start in range(0, n_time, time_chunk_size):
+        t_end = min(t_start + time_chunk_size, n_time)
+        block[:, :, t_start:t_end] = cube[t_start:t_end, y_start:y_end, :].transpose(1, 2, 0)
+    return block
+
+
+def write_block(rows, cube_filenames, time, x, y, column_indices, out_dir, varname, time_chunk_size):
+    """Write the datarods of all requested pixels in a block of rows"""
+    y_start, y_end = rows.min(), rows.max() + 1
+    blocks = {column: read_block(filename, y_start, y_end, time_chunk_size) for column, filename in cube_filenames.items()}
+    index = pd.Index(time, name="time")
+    for y_i in rows:
+        for x_j in column_indices:
+            try:
+                df = pd.DataFrame({"x": x[x_j], "y": y[y_i], **{column: block[y_i - y_start, x_j] for column, block in blocks.items()}}, index=index)
+                filename = f"{varname}_{y_i:03}_{x_j:03}.csv"
+                df.to_csv(os.path.join(out_dir, filename))
+            except Exception as e:
+                print(f"An error occurred: {e}")
+    return len(rows)
+
+
+def get_block_size(cube_filenames, block_size, max_block_bytes):
+    """Number of rows per block, reduced so that the blocks of all the variables held by a worker fit in max_block_bytes"""
+    row_bytes = 0
+    for filename in cube_filenames.values():
+        cube = np.load(filename, mmap_mode="r")
+        n_time, _, n_x = cube.shape
+        row_bytes += n_time * n_x * cube.dtype.itemsize
+    return int(max(1, min(block_size, max_block_bytes // max(row_bytes, 1))))
+
+
+def write_datarods(cube_filenames, time, x, y, out_dir, varname, row_indices=None, column_indices=None, block_size=16, time_chunk_size=365, num_processes=6, max_block_bytes=512 * 1024**2):
+    """Transpose daily grids into datarods, block of rows by block of rows
+
+    Each block is read from the on-disk grids in contiguous time chunks, transposed to pixel-major order in memory, and
+    written out pixel by pixel. Worker processes open the grids themselves, so no data is pickled between processes.
+
+    Args:
+        cube_filenames (dict): column name in the datarods -> .npy file of the (time, y, x) array
+        time (np.array): timestamps of the arrays
+        x (np.array): x coordinates (longitude) of the grid
+        y (np.array): y coordinates (latitude) of the grid
+        out_dir (str): output directory of the datarods
+        varname (str): variable name used in the datarods filenames
+        row_indices (list, optional): EASE row indices to write. Defaults to all rows.
+        column_indices (list, optional): EASE column indices to write. Defaults to all columns.
+        block_size (int, optional): maximum number of rows read and transposed at once. Defaults to 16.
+        time_chunk_size (int, optional): number of timesteps read at once. Defaults to 365.
+        num_processes (int, optional): number of worker processes. Defaults to 6.
+        max_block_bytes (int, optional): memory of the blocks of all the variables held by a worker at once; block_size is
+            lowered to fit it when there are many variables. Defaults to 512 MiB.
+    """
+    if row_indices is None:
+        row_indices = range(len(y))
+    if column_indices is None:
+        column_indices = range(len(x))
+    # Indices of the grid cells without coordinates are filled with -1
+    row_indices = np.unique(row_indices)
+    row_indices = row_indices[row_indices >= 0]
+    column_indices = np.unique(column_indices)
+    column_indices = column_indices[column_indices >= 0]
+
+    # Split the requested rows into blocks of neighbouring rows
+    block_size = get_block_size(cube_filenames, block_size, max_block_bytes)
+    blocks = []
+    for y_start in range(row_indices.min(), row_indices.max() + 1, block_size):
+        rows = row_indices[(row_indices >= y_start) & (row_indices < y_start + block_size)]
+        if len(rows) > 0:
+            blocks.append(rows)
+
+    _write_block = partial(
+        write_block,
+        cube_filenames=cube_filenames,
+        time=time,
+        x=x,
+        y=y,
+        column_indices=column_indices,
+        out_dir=out_dir,
+        varname=varname,
+        time_chunk_size=time_chunk_size,
+    )
+    with Pool(num_processes) as pool:
+        for _ in tqdm(pool.imap_unordered(_write_block, blocks), total=len(blocks)):
+            pass
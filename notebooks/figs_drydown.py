@@ -1,5 +1,6 @@
 # %% Import packages
 import os
+import sys
 import getpass
 import os
 import numpy as np
@@ -15,9 +16,15 @@ from functions import (
     exp_model_piecewise,
     tau_exp_dash,
 )
+from postprocess import read_enriched_results
+
+# The datarods are read and QC'd with the same reader as the analysis (run from the notebooks directory, as for the json files below)
+sys.path.append(os.path.join("..", "analysis"))
+from datarods import get_filename, get_soil_moisture, get_precipitation
 import matplotlib.gridspec as gridspec
 import json
 import matplotlib as mpl
+from functools import lru_cache
 
 # %% Plot config
 
@@ -52,7 +59,7 @@ coord_info_file = "coord_info.csv"
 results_file = rf"all_results_processed.csv"
 
 # %%
-df = pd.read_csv(os.path.join(output_dir, dir_name, results_file))
+df = read_enriched_results(os.path.join(output_dir, dir_name, results_file), data_dir)
 print("Loaded results file")
 coord_info = pd.read_csv(os.path.join(data_dir, datarods_dir, coord_info_file))
 
@@ -66,98 +73,97 @@ else:
 
 # %%
 ############################################################
-# Get timeseries of SM data
+# Event index and cache of the datarods of each pixel
 ############################################################
-
-
-def get_filename(varname, EASE_row_index, EASE_column_index):
-    """Get the filename of the datarod"""
-    filename = f"{varname}_{EASE_row_index:03d}_{EASE_column_index:03d}.csv"
-    return filename
-
-
-def set_time_index(df, index_name="time"):
-    """Set the datetime index to the pandas dataframe"""
-    df[index_name] = pd.to_datetime(df[index_name])
-    return df.set_index("time")
-
-
-def get_dataframe(varname, event):
-    """Get the pandas dataframe for a datarod of interest
-
-    Args:
-        varname (string): name of the variable: "SPL3SMP", "PET", "SPL4SMGP"
-
-    Returns:
-        dataframe: Return dataframe with datetime index, cropped for the timeperiod for a variable
-    """
-
-    fn = get_filename(
-        varname,
-        EASE_row_index=event.EASE_row_index,
-        EASE_column_index=event.EASE_column_index,
+# The QC'd daily soil moisture and precipitation of a pixel are saved as one (day, [day number, sm, precip]) array
+# the first time the pixel is plotted, and memory-mapped afterwards, so that each pixel csv is read only once
+datarods_cache_dir = os.path.join(output_dir, dir_name, "figs", "datarods_cache")
+os.makedirs(datarods_cache_dir, exist_ok=True)
+
+
+def to_day_number(dates):
+    """Days since 1970-01-01"""
+    return pd.to_datetime(dates).values.astype("datetime64[D]").astype(np.int64)
+
+
+def build_event_index(df):
+    """Get the pixel and the first and last day number of each event, by event_id (the label of the results dataframe)"""
+    return pd.DataFrame(
+        {
+            "EASE_row_index": df["EASE_row_index"].values,
+            "EASE_column_index": df["EASE_column_index"].values,
+            "start": to_day_number(df["event_start"]),
+            "end": to_day_number(df["event_end"]),
+        },
+        index=df.index,
     )
-    _df = pd.read_csv(os.path.join(data_dir, datarods_dir, varname, fn))
-
-    # Set time index and crop
-    df = set_time_index(_df, index_name="time")
-    return df
-
 
-def get_soil_moisture(varname="SPL3SMP", event=None):
-    """Get a datarod of soil moisture data for a pixel"""
 
-    # Get variable dataframe
-    _df = get_dataframe(varname=varname, event=event)
-
-    # Use retrieval flag to quality control the data
-    condition_bad_data_am = (
-        _df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 0.0
-    ) & (_df["Soil_Moisture_Retrieval_Data_AM_retrieval_qual_flag"] != 8.0)
-    condition_bad_data_pm = (
-        _df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 0.0
-    ) & (_df["Soil_Moisture_Retrieval_Data_PM_retrieval_qual_flag_pm"] != 8.0)
-    _df.loc[condition_bad_data_am, "Soil_Moisture_Retrieval_Data_AM_soil_moisture"] = (
-        np.nan
+def build_pixel_datarods(EASE_row_index, EASE_column_index, filename):
+    """QC the datarods of a pixel, and save them on a daily axis"""
+    sm = get_soil_moisture(data_dir, datarods_dir, EASE_row_index, EASE_column_index)
+    precip = get_precipitation(data_dir, datarods_dir, EASE_row_index, EASE_column_index)
+    _df = pd.concat([sm["sm"], precip["precip"]], axis=1).resample("D").asfreq()
+    datarods = np.column_stack(
+        [to_day_number(_df.index), _df["sm"].values, _df["precip"].values]
+    ).astype(float)
+    with open(f"{filename}.{os.getpid()}.tmp", "wb") as f:
+        np.save(f, datarods)
+    os.replace(f"{filename}.{os.getpid()}.tmp", filename)
+
+
+def is_stale(filename, EASE_row_index, EASE_column_index):
+    """Check if the saved datarods of a pixel are missing or older than any of the source datarods"""
+    if not os.path.exists(filename):
+        return True
+    source_filenames = [
+        os.path.join(
+            data_dir,
+            datarods_dir,
+            varname,
+            get_filename(varname, EASE_row_index, EASE_column_index),
+        )
+        for varname in ["SPL3SMP", "SPL4SMGP"]
+    ]
+    return any(
+        os.path.getmtime(source_filename) > os.path.getmtime(filename)
+        for source_filename in source_filenames
+        if os.path.exists(source_filename)
     )
-    _df.loc[
-        condition_bad_data_pm, "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm"
-    ] = np.nan
-
-    # If there is two different versions of 2015-03-31 data --- remove this
-    df = _df.loc[~_df.index.duplicated(keep="first")]
-
-    # Resample to regular time interval
-    df = df.resample("D").asfreq()
-
-    # Merge the AM and PM soil moisture data into one daily timeseries of data
-    df["soil_moisture_daily"] = df[
-        [
-            "Soil_Moisture_Retrieval_Data_AM_soil_moisture",
-            "Soil_Moisture_Retrieval_Data_PM_soil_moisture_pm",
-        ]
-    ].mean(axis=1, skipna=True)
-
-    return df["soil_moisture_daily"]
 
 
-def get_precipitation(varname="SPL4SMGP", event=None):
-    """Get a datarod of precipitation data for a pixel"""
+@lru_cache(maxsize=256)
+def get_pixel_datarods(EASE_row_index, EASE_column_index):
+    """Get the memory-mapped daily datarods of a pixel: columns are the day number, soil moisture, and precipitation (mm/d)
+    Saved once per pixel, and rebuilt when the source datarods are updated"""
+    filename = os.path.join(
+        datarods_cache_dir,
+        f"datarods_{EASE_row_index:03d}_{EASE_column_index:03d}.npy",
+    )
+    if is_stale(filename, EASE_row_index, EASE_column_index):
+        build_pixel_datarods(EASE_row_index, EASE_column_index, filename)
+    return np.load(filename, mmap_mode="r")
 
-    # Get variable dataframe
-    _df = get_dataframe(varname=varname, event=event)
 
-    # Drop unnccesary dimension and change variable name
-    _df = _df.drop(columns=["x", "y"]).rename(
-        {"precipitation_total_surface_flux": "precip"}, axis="columns"
+def get_event_datarods(event_id, start_date, end_date):
+    """Get the daily soil moisture and precipitation of the pixel of an event, sliced between the two dates"""
+    pixel = event_index.loc[event_id]
+    datarods = get_pixel_datarods(
+        int(pixel.EASE_row_index), int(pixel.EASE_column_index)
     )
 
-    # Convert precipitation from kg/m2/s to mm/day -> 1 kg/m2/s = 86400 mm/day
-    _df.precip = _df.precip * 86400
+    # Rows are consecutive days, so the dates are sliced by their offset from the first day
+    first_day = int(datarods[0, 0])
+    i_start = max(to_day_number([start_date])[0] - first_day, 0)
+    i_end = max(to_day_number([end_date])[0] - first_day + 1, 0)
+    window = np.array(datarods[i_start:i_end])
+    return pd.DataFrame(
+        {"soil_moisture_daily": window[:, 1], "precip": window[:, 2]},
+        index=pd.to_datetime(window[:, 0].astype(np.int64), unit="D"),
+    )
 
-    # Resample to regular time interval
-    return _df.resample("D").asfreq()
 
+event_index = build_event_index(df)
 
 # %%
 
@@ -192,12 +198,6 @@ def plot_drydown(
     ####################################################
     # Get the event data
     ####################################################
-    # Convert the modified string to a NumPy array
-    # Replace '\n' with ' ' (space) to ensure all numbers are separated by spaces
-    input_string = (
-        event.sm.replace("\n", " np.nan").replace(" nan", " np.nan").strip("[]")
-    )
-
     n_days = (pd.to_datetime(event.event_end) - pd.to_datetime(event.event_start)).days
 
     # Define variables and parameters
@@ -211,6 +211,9 @@ def plot_drydown(
         freq="H",
     )
 
+    # Datarods of the pixel, read once per pixel and sliced to the plotted window
+    df_window = get_event_datarods(event_id, start_date, end_date)
+
     ####################################################
     # Drydown plot
     ####################################################
@@ -239,7 +242,7 @@ def plot_drydown(
     # ___________________________________________________
     # PRECIPITATION
     if plot_precip:
-        df_p = get_precipitation(event=event)
+        df_p = df_window[["precip"]]
         ax2.bar(
             df_p[start_date:end_date].index,
             df_p[start_date:end_date].values.flatten(),
@@ -346,7 +349,7 @@ def plot_drydown(
 
     # ___________________________________________________
     # SOIL MOISTURE
-    df_ts = get_soil_moisture(event=event)
+    df_ts = df_window["soil_moisture_daily"]
     ax1.scatter(
         df_ts[start_date:end_date].index,
         df_ts[start_date:end_date].values,
@@ -10,6 +10,13 @@ from scipy.stats import gaussian_kde, spearmanr, mannwhitneyu, ks_2samp, median_
 from scipy.interpolate import griddata
 import statsmodels.api as statsm
 from functions import q_model, loss_model
+from postprocess import (
+    PixelStats,
+    read_enriched_results,
+    pairwise_dist_tests,
+    get_loss_curves,
+    bootstrap_percentage_q,
+)
 
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -99,7 +106,8 @@ sys.stdout = f  # Change the stdout to the file handle
 # ############################################################################
 # DATA IMPORT
 
-df = pd.read_csv(os.path.join(output_dir, dir_name, results_file))
+# Results joined with the ancillary data; cached after the first read
+df = read_enriched_results(os.path.join(output_dir, dir_name, results_file), data_dir)
 print("Loaded results file")
 
 coord_info = pd.read_csv(os.path.join(data_dir, datarods_dir, coord_info_file))
@@ -177,6 +185,11 @@ df_filt_q_and_tauexp = filter_df(df, criteria_q & criteria_tauexp)
 df_filt_q_or_exp = filter_df(df, criteria_q | criteria_exp)
 df_filt_q_and_exp = filter_df(df, criteria_q & criteria_exp)
 
+# Per-pixel statistics of the subsets shown in the maps
+pixel_stats_q = PixelStats(df_filt_q, coord_info)
+pixel_stats_q_and_exp = PixelStats(df_filt_q_and_exp, coord_info)
+pixel_stats_q_and_tauexp = PixelStats(df_filt_q_and_tauexp, coord_info)
+
 # Printing success messages and calculating events
 print_model_success("q model fit successful:", df_filt_q)
 print_model_success("exp model fit successful:", df_filt_exp)
@@ -445,55 +458,27 @@ plot_R2_models(
 # Map plots
 ###########################################################################
 def plot_map(
-    ax, df, coord_info, cmap, norm, var_item, stat_type, title="", bar_label=None
+    ax, pixel_stats, cmap, norm, var_item, stat_type, title="", bar_label=None
 ):
     plt.setp(ax.spines.values(), linewidth=0.5)
 
-    # Get the mean values of the variable
-    if stat_type == "median":
-        stat = df.groupby(["EASE_row_index", "EASE_column_index"])[
-            var_item["column_name"]
-        ].median()
-        stat_label = "Median"
-    elif stat_type == "mean":
-        stat = df.groupby(["EASE_row_index", "EASE_column_index"])[
-            var_item["column_name"]
-        ].mean()
-        stat_label = "Mean"
-
-    # Reindex to the full EASE row/index extent
-    new_index = pd.MultiIndex.from_tuples(
-        zip(coord_info["EASE_row_index"], coord_info["EASE_column_index"]),
-        names=["EASE_row_index", "EASE_column_index"],
-    )
-    stat_pad = stat.reindex(new_index, fill_value=np.nan)
-
-    # Join latitude and longitude
-    merged_df = (
-        stat_pad.reset_index()
-        .merge(
-            coord_info[
-                ["EASE_row_index", "EASE_column_index", "latitude", "longitude"]
-            ],
-            on=["EASE_row_index", "EASE_column_index"],
-            how="left",
-        )
-        .set_index(["EASE_row_index", "EASE_column_index"])
-    )
+    # Get the per-pixel median or mean values of the variable, on the EASE grid
+    grid = pixel_stats.get_grid(var_item["column_name"], stat=stat_type)
 
-    # Create pivot array
-    pivot_array = merged_df.pivot(
-        index="latitude", columns="longitude", values=var_item["column_name"]
-    )
-    pivot_array[pivot_array.index > -60]  # Exclude antarctica in the map (no df)
-
-    # Get lat and lon
-    lons = pivot_array.columns.values
-    lats = pivot_array.index.values
+    # Get lat and lon of the EASE rows and columns
+    is_row = ~np.isnan(pixel_stats.latitude)
+    is_column = ~np.isnan(pixel_stats.longitude)
+    lats = pixel_stats.latitude[is_row]
+    lons = pixel_stats.longitude[is_column]
 
     # Plot in the map
     im = ax.pcolormesh(
-        lons, lats, pivot_array, norm=norm, cmap=cmap, transform=ccrs.PlateCarree()
+        lons,
+        lats,
+        grid[np.ix_(is_row, is_column)],
+        norm=norm,
+        cmap=cmap,
+        transform=ccrs.PlateCarree(),
     )
     ax.set_extent([-160, 170, -60, 90], crs=ccrs.PlateCarree())
     ax.coastlines(linewidth=0.5)
@@ -555,8 +540,7 @@ fig_map_R2, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_exp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_exp,
     cmap="RdBu",
     norm=norm_exp,
     var_item=var_dict[var_key_exp],
@@ -575,8 +559,7 @@ fig_map_R2, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_tauexp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_tauexp,
     cmap="RdBu",
     norm=norm_tauexp,
     var_item=var_dict[var_key_tauexp],
@@ -606,8 +589,7 @@ fig_map_q, ax = plt.subplots(figsize=(9, 9), subplot_kw={"projection": ccrs.Robi
 stat_type = "median"
 plot_map(
     ax=ax,
-    df=df_filt_q,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q,
     cmap=q_cmap,
     norm=norm,
     var_item=var_dict[var_key],
@@ -632,8 +614,7 @@ fig_map_theta_star, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q,
     cmap="YlGnBu",
     norm=norm,
     var_item=var_dict[var_key],
@@ -656,8 +637,7 @@ fig_map_ETmax, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q,
     cmap="YlGnBu",
     norm=norm,
     var_item=var_dict[var_key],
@@ -732,6 +712,7 @@ def plot_loss_func(
     title="",
     plot_legend=False,
     median_by_pixel=False,
+    n_bootstrap=0,
 ):
 
     # Get category/histogram bins to enumerate
@@ -747,38 +728,36 @@ def plot_loss_func(
     else:
         bins_sorted = categories
 
-    # For each row in the subset, calculate the loss for a range of theta values
-    for i, category in enumerate(bins_sorted):
-        # Get subset
-        subset = df[df[z_var["column_name"]] == category]
-
-        # Get the median of all the related loss function parameters
-        if not median_by_pixel:
-            theta_w = subset["q_theta_w"].median()
-            theta_star = subset["q_theta_star"].median()
-            ETmax = subset["q_ETmax"].median()
-            q = subset["q_q"].median()
-        else:
-            theta_w = subset["q_theta_w_median"].median()
-            theta_star = subset["q_theta_star_median"].median()
-            ETmax = subset["q_ETmax_median"].median()
-            q = subset["q_q_median"].median()
-
-        # Calculate the loss function
-        theta = np.arange(theta_w, theta_star, 0.01)
-        dtheta = loss_model(
-            theta=theta, q=q, ETmax=ETmax, theta_w=theta_w, theta_star=theta_star
-        )
+    # Loss functions from the median parameters of all the categories, on a common theta grid
+    curves = get_loss_curves(
+        df,
+        z_var["column_name"],
+        bins_sorted,
+        median_by_pixel=median_by_pixel,
+        n_bootstrap=n_bootstrap,
+    )
 
+    for i, category in enumerate(bins_sorted):
         # Plot loss function from median parameters
         ax.plot(
-            theta,
-            dtheta,
+            curves["theta"][i],
+            curves["dtheta"][i],
             label=f"{category}",
             color=colors[i],
             linewidth=3,
         )
 
+        # Plot the bootstrap confidence band
+        if n_bootstrap > 0:
+            ax.fill_between(
+                curves["theta"][i],
+                curves["lower"][i],
+                curves["upper"][i],
+                color=colors[i],
+                alpha=0.2,
+                linewidth=0,
+            )
+
     ax.invert_yaxis()
     ax.set_xlabel(
         f"{var_dict['theta']['label']}\n{var_dict['theta']['symbol']} {var_dict['theta']['unit']}"
@@ -1355,8 +1334,10 @@ def get_df_percentage_q(
     weight_by,
     bins=[0, 20, 40, 60, 80, 100],
     labels=["0-20%", "20-40%", "40-60%", "60-80%", "80-100%"],
+    n_bootstrap=0,
+    ci=0.9,
+    num_processes=1,
 ):
-
     # Bin AI values
     x2_new_varname = x2_varname + "_binned2"
     df[x2_new_varname] = pd.cut(
@@ -1427,6 +1408,28 @@ def get_df_percentage_q(
         )
         * 100
     )
+
+    # Confidence intervals of the percentages, from resampling the events within each bin
+    if n_bootstrap > 0:
+        grouped = df.groupby([x2_new_varname, x1_new_varname], observed=True)
+        # Events outside the bins are numbered -1 (or NaN)
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=int)
+        is_binned = codes >= 0
+        percentage_ci = bootstrap_percentage_q(
+            codes[is_binned],
+            is_q_gt_1=(df[y_varname] > 1).to_numpy()[is_binned],
+            weight=df[weight_by].to_numpy(dtype=float)[is_binned],
+            n_bootstrap=n_bootstrap,
+            ci=ci,
+            num_processes=num_processes,
+        )
+        percentage_ci.index = grouped.size().index
+        percentage_df = pd.merge(
+            percentage_df,
+            percentage_ci.reset_index(),
+            on=[x2_new_varname, x1_new_varname],
+            how="left",
+        )
     return percentage_df
 
 
@@ -1436,6 +1439,7 @@ percentage_df = get_df_percentage_q(
     x2_varname="AI",
     y_varname="q_q",
     weight_by="event_length",
+    n_bootstrap=1000,
 )
 # percentage_df_median = get_df_percentage_q(df=df_filt_q_conus_agg, x1_varname="fractional_wood_median", x2_varname="AI_median", y_varname="q_q_median", weight_by="event_length_median")
 # %%
@@ -1521,6 +1525,21 @@ def plot_grouped_stacked_bar(
 
                 bottom_value += subset[y_var].values[0]
 
+            # Confidence interval of the boundary between q<1 and q>1
+            if f"{y_vars[0]}_lower" in subset.columns:
+                value = subset[y_vars[0]].values[0]
+                ax.errorbar(
+                    x_pos,
+                    value,
+                    yerr=[
+                        [value - subset[f"{y_vars[0]}_lower"].values[0]],
+                        [subset[f"{y_vars[0]}_upper"].values[0] - value],
+                    ],
+                    color="k",
+                    linewidth=0.8,
+                    capsize=2,
+                )
+
     # Set the x-ticks to the middle of the groups
     ax.set_xticks(
         [
@@ -1775,7 +1794,9 @@ fig_hist_q_sand2.savefig(
 # %% #####################################################
 # Statistical significance #############################
 #####################################################
-def stat_dist_test(df, x_var, z_var, cmap=None, categories=None, colors=None):
+def stat_dist_test(
+    df, x_var, z_var, cmap=None, categories=None, colors=None, num_processes=1
+):
     if categories is None:
         # Get unique bins
         bins_in_range = df[z_var["column_name"]].unique()
@@ -1786,46 +1807,16 @@ def stat_dist_test(df, x_var, z_var, cmap=None, categories=None, colors=None):
     else:
         bins_sorted = categories
 
-    # Prepare DataFrame to store the p-values
-    p_values_mw = pd.DataFrame(index=bins_sorted, columns=bins_sorted)
-    p_values_ks = pd.DataFrame(index=bins_sorted, columns=bins_sorted)
-    p_values_median = pd.DataFrame(index=bins_sorted, columns=bins_sorted)
-
-    # For each row in the subset, calculate the loss for a range of theta values
-    for i, category in enumerate(bins_sorted):
-        subset = df[df[z_var["column_name"]] == category]
-
-        # Calculate the statistical differences between each pair of categories
-        for j, other_category in enumerate(bins_sorted):
-            if i > j:
-                other_subset = df[df[z_var["column_name"]] == other_category]
-                _, p_mw = mannwhitneyu(
-                    subset[x_var["column_name"]].values,
-                    other_subset[x_var["column_name"]].values,
-                    alternative="two-sided",
-                )
-                _, p_ks = ks_2samp(
-                    subset[x_var["column_name"]].values,
-                    other_subset[x_var["column_name"]].values,
-                )
-                stat, p_med, _, _ = median_test(
-                    subset[x_var["column_name"]].values,
-                    other_subset[x_var["column_name"]].values,
-                )
-
-                # p_values_mw.at[category, other_category] = p_mw
-                p_values_mw.at[other_category, category] = p_mw
-                # p_values_ks.at[category, other_category] = p_ks
-                p_values_ks.at[other_category, category] = p_ks
-                # p_values_median.at[category, other_category] = p_med
-                p_values_median.at[other_category, category] = p_med
-
-    # Outputting the p-values as a heatmap for visibility
-    p_values_mw = p_values_mw.apply(pd.to_numeric, errors="coerce").fillna(np.nan)
-    # p_values_ks = p_values_ks.apply(pd.to_numeric, errors="coerce").fillna(np.nan)
-    p_values_median = p_values_median.apply(pd.to_numeric, errors="coerce").fillna(
-        np.nan
+    # p-values of the tests between each pair of categories, with the data partitioned by category once
+    p_values = pairwise_dist_tests(
+        df[x_var["column_name"]].values,
+        df[z_var["column_name"]].values,
+        bins_sorted,
+        num_processes=num_processes,
     )
+    p_values_mw = p_values["mannwhitneyu"]
+    # p_values_ks = p_values["ks"]
+    p_values_median = p_values["median"]
 
     # Create a custom colormap
     colors = ["#2b8cbe", "#a6bddb", "#ece7f2"]  # dark blue, blue, white
@@ -10,6 +10,7 @@ from scipy.stats import gaussian_kde, spearmanr, mannwhitneyu, ks_2samp, median_
 from scipy.interpolate import griddata
 import statsmodels.api as statsm
 from functions import q_model, loss_model
+from postprocess import PixelStats, read_enriched_results
 
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -103,7 +104,8 @@ sys.stdout = f  # Change the stdout to the file handle
 # ############################################################################
 # DATA IMPORT
 
-df = pd.read_csv(os.path.join(output_dir, dir_name, results_file))
+# Results joined with the ancillary data; cached after the first read
+df = read_enriched_results(os.path.join(output_dir, dir_name, results_file), data_dir)
 print("Loaded results file\n")
 
 coord_info = pd.read_csv(os.path.join(data_dir, datarods_dir, coord_info_file))
@@ -191,6 +193,11 @@ df_filt_q_and_tauexp = filter_df(df, criteria_q & criteria_tauexp)
 df_filt_q_or_exp = filter_df(df, criteria_q | criteria_exp)
 df_filt_q_and_exp = filter_df(df, criteria_q & criteria_exp)
 
+# Per-pixel statistics of the subsets shown in the maps
+pixel_stats_q = PixelStats(df_filt_q, coord_info)
+pixel_stats_q_and_exp = PixelStats(df_filt_q_and_exp, coord_info)
+pixel_stats_q_and_tauexp = PixelStats(df_filt_q_and_tauexp, coord_info)
+
 # Printing success messages and calculating events
 print_model_success("q model fit successful:", df_filt_q)
 print_model_success("exp model fit successful:", df_filt_exp)
@@ -486,55 +493,27 @@ plot_model_metrics(
 # Map plots
 ###########################################################################
 def plot_map(
-    ax, df, coord_info, cmap, norm, var_item, stat_type, title="", bar_label=None
+    ax, pixel_stats, cmap, norm, var_item, stat_type, title="", bar_label=None
 ):
     plt.setp(ax.spines.values(), linewidth=0.5)
 
-    # Get the mean values of the variable
-    if stat_type == "median":
-        stat = df.groupby(["EASE_row_index", "EASE_column_index"])[
-            var_item["column_name"]
-        ].median()
-        stat_label = "Median"
-    elif stat_type == "mean":
-        stat = df.groupby(["EASE_row_index", "EASE_column_index"])[
-            var_item["column_name"]
-        ].mean()
-        stat_label = "Mean"
+    # Get the per-pixel median or mean values of the variable, on the EASE grid
+    grid = pixel_stats.get_grid(var_item["column_name"], stat=stat_type)
 
-    # Reindex to the full EASE row/index extent
-    new_index = pd.MultiIndex.from_tuples(
-        zip(coord_info["EASE_row_index"], coord_info["EASE_column_index"]),
-        names=["EASE_row_index", "EASE_column_index"],
-    )
-    stat_pad = stat.reindex(new_index, fill_value=np.nan)
-
-    # Join latitude and longitude
-    merged_df = (
-        stat_pad.reset_index()
-        .merge(
-            coord_info[
-                ["EASE_row_index", "EASE_column_index", "latitude", "longitude"]
-            ],
-            on=["EASE_row_index", "EASE_column_index"],
-            how="left",
-        )
-        .set_index(["EASE_row_index", "EASE_column_index"])
-    )
-
-    # Create pivot array
-    pivot_array = merged_df.pivot(
-        index="latitude", columns="longitude", values=var_item["column_name"]
-    )
-    pivot_array[pivot_array.index > -60]  # Exclude antarctica in the map (no df)
-
-    # Get lat and lon
-    lons = pivot_array.columns.values
-    lats = pivot_array.index.values
+    # Get lat and lon of the EASE rows and columns
+    is_row = ~np.isnan(pixel_stats.latitude)
+    is_column = ~np.isnan(pixel_stats.longitude)
+    lats = pixel_stats.latitude[is_row]
+    lons = pixel_stats.longitude[is_column]
 
     # Plot in the map
     im = ax.pcolormesh(
-        lons, lats, pivot_array, norm=norm, cmap=cmap, transform=ccrs.PlateCarree()
+        lons,
+        lats,
+        grid[np.ix_(is_row, is_column)],
+        norm=norm,
+        cmap=cmap,
+        transform=ccrs.PlateCarree(),
     )
     ax.set_extent([-160, 170, -60, 90], crs=ccrs.PlateCarree())
     ax.coastlines(linewidth=0.5)
@@ -597,8 +576,7 @@ fig_map_aic, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_exp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_exp,
     cmap="RdBu_r",
     norm=norm_exp,
     var_item=var_dict[var_key_exp],
@@ -617,8 +595,7 @@ fig_map_aic, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_tauexp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_tauexp,
     cmap="RdBu_r",
     norm=norm_tauexp,
     var_item=var_dict[var_key_tauexp],
@@ -644,8 +621,7 @@ fig_map_aicc, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_exp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_exp,
     cmap="RdBu_r",
     norm=norm_exp,
     var_item=var_dict[var_key_exp],
@@ -664,8 +640,7 @@ fig_map_aicc, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_tauexp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_tauexp,
     cmap="RdBu_r",
     norm=norm_tauexp,
     var_item=var_dict[var_key_tauexp],
@@ -697,8 +672,7 @@ fig_map_bic, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_exp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_exp,
     cmap="RdBu_r",
     norm=norm_exp,
     var_item=var_dict[var_key_exp],
@@ -717,8 +691,7 @@ fig_map_bic, ax = plt.subplots(
 )
 plot_map(
     ax=ax,
-    df=df_filt_q_and_tauexp,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q_and_tauexp,
     cmap="RdBu_r",
     norm=norm_tauexp,
     var_item=var_dict[var_key_tauexp],
@@ -744,8 +717,7 @@ fig_map_tau, ax = plt.subplots(
 stat_type = "median"
 plot_map(
     ax=ax,
-    df=df_filt_q,
-    coord_info=coord_info,
+    pixel_stats=pixel_stats_q,
     cmap="YlGnBu",
     norm=norm,
     var_item=var_dict[var_key],
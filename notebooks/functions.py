@@ -97,6 +97,23 @@ def drydown_piecewise(t, model, ETmax, theta_0, theta_star, z=50.0):
 
 
 def q_model_piecewise(t, q, ETmax, theta_0, theta_star, theta_w, z=50.0):
+    """
+    Calculate the drydown curve assuming that both Stage I (ETmax-limited, linear) and Stage II (q model) are happening.
+    The Stage II curve is also evaluated on the Stage I timesteps, where its base can be negative (q > 1), and then discarded by np.where;
+    the invalid-power warnings of those timesteps are silenced.
+
+    Parameters:
+        t (int): Timestep, in day.
+        q (float): Degree of non-linearity in the soil moisture response.
+        ETmax (float): Maximum evapotranpisration rate in mm/day.
+        theta_0 (float): The initial soil moisture after precipitation, in m3/m3
+        theta_star (float): Critical soil moisture content, equal to s_star * porosity, in m3/m3
+        theta_w (float): Wilting point soil moisture content, equal to s_star * porosity, in m3/m3
+        z (float): Soil thicness in mm. Default is 50 mm
+
+    Returns:
+        float: Soil moisture content for the given timestep, in m3/m3.
+    """
 
     k = (
         ETmax / z
@@ -104,13 +121,14 @@ def q_model_piecewise(t, q, ETmax, theta_0, theta_star, theta_w, z=50.0):
 
     t_star = (theta_0 - theta_star) / k  # Time it takes from theta_0 to theta_star
 
-    return np.where(
-        t_star > t,
-        -k * t + theta_0,
-        q_model(
-            t, q, ETmax, theta_0, theta_star, theta_w, t_star=np.maximum(t_star, 0)
-        ),
-    )
+    with np.errstate(invalid="ignore"):
+        return np.where(
+            t_star > t,
+            -k * t + theta_0,
+            q_model(
+                t, q, ETmax, theta_0, theta_star, theta_w, t_star=np.maximum(t_star, 0)
+            ),
+        )
 
 
 def exp_model_piecewise(t, ETmax, theta_0, theta_star, theta_w, z=50.0):
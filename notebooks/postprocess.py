@@ -0,0 +1,546 @@
+import os
+import sys
+import glob
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from scipy.special import ndtr
+from scipy.stats import mannwhitneyu, ks_2samp, median_test
+from functions import loss_model
+
+# The results codec and the event metrics are shared with the analysis package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from ragged import RaggedArray, read_results, write_results, get_file_hash
+from criteria import calc_large_q_criteria
+
+# Ancillary files joined to the results
+datarods_dir = "datarods"
+anc_dir = "SMAP_L1_L3_ANC_STATIC"
+coord_info_file = "coord_info.csv"
+anc_file = "anc_info.csv"
+ai_file = "AridityIndex_from_datarods.csv"
+IGBPclass_file = "IGBP_class.csv"
+
+
+def calc_first3_avail2(time):
+    """Check if at least two of the first three timesteps (0, 1, 2) of each event are observed
+
+    Args:
+        time (RaggedArray): observed timesteps of each event
+    """
+    is_first3 = (time.positions() < 3) & (time.values < 3)
+    return time.count(where=is_first3) >= 2
+
+
+def calc_sm_range(sm, min_sm, max_sm):
+    """Soil moisture range covered by the observations of each event, normalized by the range of the pixel
+
+    Args:
+        sm (RaggedArray): observed soil moisture of each event
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sm_range = np.where(max_sm != min_sm, (sm.nanmax() - sm.nanmin()) / (max_sm - min_sm), np.nan)
+    return np.abs(sm_range)
+
+
+def calc_event_ndays(sm):
+    """Number of days with soil moisture observations in each event
+
+    Args:
+        sm (RaggedArray): observed soil moisture of each event
+    """
+    return sm.count()
+
+
+def add_event_metrics(df, z_mm=50.0):
+    """Add first3_avail2, sm_range, event_length, large_q_criteria and event_ndays columns to the results
+
+    The metrics are already written by DrydownModel in the recent results; they are only computed here
+    for the results saved before that
+
+    Args:
+        df (pd.DataFrame): results read from all_results.csv with ragged.read_results
+        z_mm (float, optional): soil thickness in mm. Defaults to 50.
+
+    Returns:
+        pd.DataFrame: results with the new columns
+    """
+    metrics = ["first3_avail2", "sm_range", "event_length", "large_q_criteria", "event_ndays"]
+    if all(metric in df.columns for metric in metrics):
+        return df
+
+    time = RaggedArray.from_arrays(df["time"], dtype=np.int64)
+    sm = RaggedArray.from_arrays(df["sm"])
+
+    df["first3_avail2"] = calc_first3_avail2(time)
+    df["sm_range"] = calc_sm_range(sm, df["min_sm"].to_numpy(), df["max_sm"].to_numpy())
+    df["event_length"] = (pd.to_datetime(df["event_end"]) - pd.to_datetime(df["event_start"])).dt.days + 1
+    df["large_q_criteria"] = calc_large_q_criteria(
+        q=df["q_q"].to_numpy(),
+        ETmax=df["q_ETmax"].to_numpy(),
+        theta_star=df["q_theta_star"].to_numpy(),
+        theta_w=df["q_theta_w"].to_numpy(),
+        z=z_mm,
+    )
+    df["event_ndays"] = calc_event_ndays(sm)
+    return df
+
+
+class PixelStats:
+    """Per-pixel statistics of all the numeric columns of the results, computed once, and mapped onto the EASE grid by direct indexing
+
+    Args:
+        df (pd.DataFrame): results (typically a filtered subset)
+        coord_info (pd.DataFrame): latitude and longitude of the EASE rows and columns
+        quantiles (tuple, optional): quantiles to compute in addition to median, mean and count. Defaults to (0.25, 0.75).
+    """
+
+    def __init__(self, df, coord_info, quantiles=(0.25, 0.75)):
+        columns = df.select_dtypes("number").columns.drop(["EASE_row_index", "EASE_column_index"], errors="ignore")
+        grouped = df.groupby(["EASE_row_index", "EASE_column_index"])[list(columns)]
+        stats = {"median": grouped.median(), "mean": grouped.mean(), "count": grouped.count()}
+        for q in quantiles:
+            stats[f"q{q * 100:g}"] = grouped.quantile(q)
+        # Columns are (statistic, result column)
+        self.table = pd.concat(stats, axis=1)
+
+        self.row_index = self.table.index.get_level_values("EASE_row_index").to_numpy(dtype=int)
+        self.column_index = self.table.index.get_level_values("EASE_column_index").to_numpy(dtype=int)
+        self.latitude, self.longitude = self.get_coordinates(coord_info)
+        self.grids = {}
+
+    def get_coordinates(self, coord_info):
+        """Get the latitude of each EASE row and the longitude of each EASE column, positioned by their EASE index"""
+        coord_info = coord_info[(coord_info["EASE_row_index"] >= 0) & (coord_info["EASE_column_index"] >= 0)]
+        rows = coord_info["EASE_row_index"].to_numpy(dtype=int)
+        columns = coord_info["EASE_column_index"].to_numpy(dtype=int)
+        latitude = np.full(max(rows.max(), self.row_index.max(initial=0)) + 1, np.nan)
+        latitude[rows] = coord_info["latitude"].to_numpy()
+        longitude = np.full(max(columns.max(), self.column_index.max(initial=0)) + 1, np.nan)
+        longitude[columns] = coord_info["longitude"].to_numpy()
+        return latitude, longitude
+
+    def get_grid(self, column, stat="median"):
+        """Get the (EASE row, EASE column) array of a statistic of a result column; NaN where there is no event"""
+        if (column, stat) not in self.grids:
+            grid = np.full((len(self.latitude), len(self.longitude)), np.nan)
+            grid[self.row_index, self.column_index] = self.table[(stat, column)].to_numpy()
+            self.grids[(column, stat)] = grid
+        return self.grids[(column, stat)]
+
+
+def get_pixel_positions(df, table):
+    """Get the row of the table for the pixel of each event (-1 if the pixel is not in the table), by direct indexing into a (row, column) array"""
+    rows, columns = df["EASE_row_index"].to_numpy(dtype=int), df["EASE_column_index"].to_numpy(dtype=int)
+    table = table[(table["EASE_row_index"] >= 0) & (table["EASE_column_index"] >= 0)]
+    table_rows, table_columns = table["EASE_row_index"].to_numpy(dtype=int), table["EASE_column_index"].to_numpy(dtype=int)
+
+    shape = (max(rows.max(initial=0), table_rows.max(initial=0)) + 1, max(columns.max(initial=0), table_columns.max(initial=0)) + 1)
+    position = np.full(shape, -1)
+    # Assigned in the reverse order so that the first row of a duplicated pixel is kept
+    position[table_rows[::-1], table_columns[::-1]] = table.index.to_numpy()[::-1]
+
+    positions = np.full(len(df), -1)
+    is_valid = (rows >= 0) & (columns >= 0)
+    positions[is_valid] = position[rows[is_valid], columns[is_valid]]
+    return positions
+
+
+def join_rows(df, table, positions, on=()):
+    """Left-join the rows of the table at the given positions (-1 for no match) to the events, as pd.merge(how="left") does"""
+    columns = [column for column in table.columns if column not in on]
+    right = table[columns].reindex(positions)
+    right.index = df.index
+
+    # Columns in both tables are suffixed as in pd.merge
+    overlap = set(columns) & set(df.columns)
+    df = df.rename(columns={column: f"{column}_x" for column in overlap})
+    right = right.rename(columns={column: f"{column}_y" for column in overlap})
+    return pd.concat([df, right], axis=1)
+
+
+def read_ancillary(data_dir):
+    """Read the ancillary tables joined to the results: coordinates, sand fraction and land cover, aridity index, and IGBP classes"""
+    coord_info = pd.read_csv(os.path.join(data_dir, datarods_dir, coord_info_file))
+
+    df_anc = pd.read_csv(os.path.join(data_dir, datarods_dir, anc_file)).drop(["spatial_ref", "latitude", "longitude"], axis=1)
+    df_anc.loc[df_anc["sand_fraction"] < 0, "sand_fraction"] = np.nan
+
+    df_ai = pd.read_csv(os.path.join(data_dir, datarods_dir, ai_file)).drop(["latitude", "longitude"], axis=1)
+    df_ai.loc[df_ai["AI"] < 0, "AI"] = np.nan
+
+    IGBPclass = pd.read_csv(os.path.join(data_dir, anc_dir, IGBPclass_file))
+    return coord_info, df_anc, df_ai, IGBPclass
+
+
+def add_ancillary(df, data_dir):
+    """Join the ancillary attributes of the pixel (and of its land cover class) to each event
+
+    Same columns as merging coord_info, anc_info and the aridity index on (EASE_row_index, EASE_column_index), and IGBP_class on the land cover,
+    but each table is joined by direct integer indexing rather than by pd.merge.
+    The ancillary columns already in the results (e.g., all_results_processed.csv files saved with the ancillary data) are replaced
+    """
+    pixel_key = ["EASE_row_index", "EASE_column_index"]
+    coord_info, df_anc, df_ai, IGBPclass = read_ancillary(data_dir)
+
+    # Drop the ancillary columns, and their suffixed copies, already in the results
+    ancillary_columns = set().union(*[table.columns for table in [coord_info, df_anc, df_ai, IGBPclass]]) - set(pixel_key)
+    ancillary_columns |= {f"{column}_{suffix}" for column in ancillary_columns for suffix in ["x", "y"]}
+    df = df.drop(columns=[column for column in df.columns if column in ancillary_columns])
+
+    for table in [coord_info, df_anc, df_ai]:
+        table = table.reset_index(drop=True)
+        df = join_rows(df, table, get_pixel_positions(df, table), on=pixel_key)
+
+    IGBPclass = IGBPclass.reset_index(drop=True)
+    positions = pd.Index(IGBPclass["class"]).get_indexer(df["IGBP_landcover"])
+    return join_rows(df, IGBPclass, positions)
+
+
+def read_enriched_results(results_filepath, data_dir, **kwargs):
+    """Read the results joined with the ancillary attributes.
+    The joined table is cached in a parquet file next to the results, keyed by the hash of the results and ancillary files
+
+    Args:
+        results_filepath (str): path to the results csv file
+        data_dir (str): data directory
+        **kwargs: passed to pd.read_csv
+
+    Returns:
+        pd.DataFrame: results with the ancillary attributes (the per-event arrays are not included)
+    """
+    ancillary_filenames = [
+        os.path.join(data_dir, datarods_dir, coord_info_file),
+        os.path.join(data_dir, datarods_dir, anc_file),
+        os.path.join(data_dir, datarods_dir, ai_file),
+        os.path.join(data_dir, anc_dir, IGBPclass_file),
+    ]
+    key = get_file_hash([results_filepath] + ancillary_filenames)[:16]
+    stem = os.path.splitext(results_filepath)[0]
+    cache_filepath = f"{stem}_enriched_{key}.parquet"
+    if os.path.exists(cache_filepath):
+        return pd.read_parquet(cache_filepath)
+
+    df = add_ancillary(pd.read_csv(results_filepath, **kwargs), data_dir)
+
+    # Keep only the cache of the current results and ancillary files
+    for filename in glob.glob(f"{glob.escape(stem)}_enriched_*.parquet"):
+        os.remove(filename)
+    df.to_parquet(f"{cache_filepath}.tmp")
+    os.replace(f"{cache_filepath}.tmp", cache_filepath)
+    return df
+
+
+class SortedGroup:
+    """Sorted values of a category, with the counts of the distinct values, shared by all the pairwise tests of the category"""
+
+    def __init__(self, values):
+        self.values = values
+        self.has_nan = np.isnan(values).any()
+        self.unique, self.counts = np.unique(values, return_counts=True)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def split_by_category(values, categories, order):
+    """Partition the values by category in one sort
+
+    Args:
+        values (np.array): values to test
+        categories (np.array): category of each value
+        order (list): categories to test, in the order of the output
+
+    Returns:
+        list: SortedGroup of each category
+    """
+    codes = pd.Categorical(categories, categories=list(order)).codes
+    values = np.asarray(values, dtype=float)
+    sort = np.lexsort((values, codes))
+    codes, values = codes[sort], values[sort]
+    bounds = np.searchsorted(codes, np.arange(len(order) + 1))
+    return [SortedGroup(values[bounds[i] : bounds[i + 1]]) for i in range(len(order))]
+
+
+def mannwhitneyu_sorted(x, y):
+    """Two-sided Mann-Whitney U test on two SortedGroups; same p-value as scipy.stats.mannwhitneyu, without ranking the pooled sample"""
+    n1, n2 = len(x), len(y)
+    if x.has_nan or y.has_nan or n1 == 0 or n2 == 0:
+        return np.nan
+
+    # Number of the values in the pooled sample that are tied
+    unique = np.union1d(x.unique, y.unique)
+    t = np.zeros(len(unique))
+    t[np.searchsorted(unique, x.unique)] += x.counts
+    t[np.searchsorted(unique, y.unique)] += y.counts
+    if not (n1 > 8 and n2 > 8) and not (t > 1).any():
+        # scipy uses the exact distribution for small samples without ties
+        return mannwhitneyu(x.values, y.values, alternative="two-sided").pvalue
+
+    # U1 = number of (x > y) pairs + half the number of (x == y) pairs
+    U1 = np.sum(
+        x.counts
+        * (np.searchsorted(y.values, x.unique, "left") + np.searchsorted(y.values, x.unique, "right"))
+        / 2
+    )
+    U = max(U1, n1 * n2 - U1)
+
+    # Normal approximation with the tie and continuity corrections
+    n = n1 + n2
+    s = np.sqrt(n1 * n2 / 12 * ((n + 1) - np.sum(t**3 - t) / (n * (n - 1))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (U - n1 * n2 / 2 - 0.5) / s
+    return float(np.clip(2 * ndtr(-z), 0.0, 1.0))
+
+
+def test_pair(groups, pair):
+    """Mann-Whitney U, Kolmogorov-Smirnov and Mood's median test p-values between two categories"""
+    i, j = pair
+    x, y = groups[i], groups[j]
+    if len(x) == 0 or len(y) == 0:
+        return i, j, np.nan, np.nan, np.nan
+    p_mw = mannwhitneyu_sorted(x, y)
+    _, p_ks = ks_2samp(x.values, y.values)
+    _, p_med, _, _ = median_test(x.values, y.values)
+    return i, j, p_mw, p_ks, p_med
+
+
+# Groups shared by the tasks (pairwise tests, bootstrap resamples), set in each worker process.
+# The worker processes default to off (num_processes=1): under the spawn start method (Windows), each worker re-runs the
+# calling script, and the figure scripts have no __main__ guard
+pool_groups = None
+
+
+def init_pool_groups(groups):
+    global pool_groups
+    pool_groups = groups
+
+
+def test_pair_in_pool(pair):
+    return test_pair(pool_groups, pair)
+
+
+def pairwise_dist_tests(values, categories, order, num_processes=1):
+    """Test the difference of the distributions between all the pairs of categories
+
+    Args:
+        values (np.array): values to test
+        categories (np.array): category of each value
+        order (list): categories to test, in the order of the output
+        num_processes (int, optional): number of worker processes for the tests, only from a script with a __main__ guard. Defaults to 1.
+
+    Returns:
+        dict: "mannwhitneyu", "ks" and "median" p-values, as (category, category) dataframes filled above the diagonal
+    """
+    order = list(order)
+    groups = split_by_category(values, categories, order)
+    pairs = [(i, j) for i in range(len(order)) for j in range(len(order)) if i > j]
+
+    if num_processes > 1:
+        with Pool(num_processes, initializer=init_pool_groups, initargs=(groups,)) as pool:
+            results = pool.map(test_pair_in_pool, pairs)
+    else:
+        results = [test_pair(groups, pair) for pair in pairs]
+
+    p_values = {test: pd.DataFrame(np.nan, index=order, columns=order) for test in ["mannwhitneyu", "ks", "median"]}
+    for i, j, p_mw, p_ks, p_med in results:
+        p_values["mannwhitneyu"].iloc[j, i] = p_mw
+        p_values["ks"].iloc[j, i] = p_ks
+        p_values["median"].iloc[j, i] = p_med
+    return p_values
+
+
+def get_theta_grid(theta_w, theta_star, step=0.01):
+    """Common (category, theta) grid: row i holds np.arange(theta_w[i], theta_star[i], step), padded with NaN"""
+    with np.errstate(invalid="ignore"):
+        n_theta = np.ceil((theta_star - theta_w) / step)
+    n_theta = np.where(np.isfinite(n_theta), np.maximum(n_theta, 0), 0).astype(int)
+    k = np.arange(n_theta.max(initial=0))
+    theta = theta_w[:, None] + k[None, :] * step
+    return np.where(k[None, :] < n_theta[:, None], theta, np.nan)
+
+
+def bootstrap_medians(values, n_bootstrap, rng, max_size=10_000_000):
+    """Medians of the columns of values (event, parameter) over bootstrap resamples of the events, drawn in batches of resamples
+
+    Returns:
+        np.array: (n_bootstrap, parameter) medians
+    """
+    n = len(values)
+    if n == 0:
+        return np.full((n_bootstrap, values.shape[1]), np.nan)
+    batch_size = max(1, max_size // n)
+    medians = []
+    for i_start in range(0, n_bootstrap, batch_size):
+        index = rng.integers(0, n, size=(min(batch_size, n_bootstrap - i_start), n))
+        medians.append(np.nanmedian(values[index], axis=1))
+    return np.concatenate(medians)
+
+
+def get_loss_curves(
+    df,
+    z_column,
+    categories,
+    median_by_pixel=False,
+    step=0.01,
+    z_mm=50.0,
+    n_bootstrap=0,
+    ci=0.9,
+    seed=0,
+):
+    """Loss functions from the median q model parameters of each category, evaluated for all the categories at once
+
+    Args:
+        df (pd.DataFrame): results, or per-pixel results with the <parameter>_median columns
+        z_column (str): column of the categories
+        categories (list): categories, in the order of the output
+        median_by_pixel (bool, optional): use the per-pixel median parameters. Defaults to False.
+        step (float, optional): theta step in m3/m3. Defaults to 0.01.
+        z_mm (float, optional): soil thickness in mm. Defaults to 50.
+        n_bootstrap (int, optional): number of bootstrap resamples for the confidence band; no band if 0. Defaults to 0.
+        ci (float, optional): coverage of the confidence band. Defaults to 0.9.
+        seed (int, optional): seed of the bootstrap. Defaults to 0.
+
+    Returns:
+        dict: "parameters" (median parameters of each category), "theta" and "dtheta" (category, theta) arrays, NaN beyond theta_star,
+            and "lower" and "upper" (category, theta) bounds of the band if n_bootstrap > 0
+    """
+    categories = list(categories)
+    params = ["q_q", "q_ETmax", "q_theta_w", "q_theta_star"]
+    columns = [f"{param}_median" if median_by_pixel else param for param in params]
+
+    grouped = df.groupby(z_column, observed=True)[columns]
+    medians = grouped.median().reindex(categories)
+    medians.columns = params
+    q, ETmax, theta_w, theta_star = (medians[param].to_numpy(dtype=float)[:, None] for param in params)
+
+    theta = get_theta_grid(theta_w[:, 0], theta_star[:, 0], step=step)
+    with np.errstate(invalid="ignore"):
+        dtheta = loss_model(theta=theta, q=q, ETmax=ETmax, theta_w=theta_w, theta_star=theta_star, z=z_mm)
+    curves = {"parameters": medians, "theta": theta, "dtheta": dtheta}
+
+    if n_bootstrap > 0:
+        # (resample, category, parameter) medians; each category is resampled within its own events
+        rng = np.random.default_rng(seed)
+        groups = dict(list(grouped))
+        boot = np.stack(
+            [
+                bootstrap_medians(
+                    groups[category].to_numpy(dtype=float) if category in groups else np.empty((0, len(params))),
+                    n_bootstrap,
+                    rng,
+                )
+                for category in categories
+            ],
+            axis=1,
+        )
+        q, ETmax, theta_w, theta_star = (boot[:, :, k, None] for k in range(len(params)))
+
+        # Evaluated on the theta grid of the median parameters
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dtheta_boot = loss_model(theta=theta[None], q=q, ETmax=ETmax, theta_w=theta_w, theta_star=theta_star, z=z_mm)
+            dtheta_boot = np.where(theta[None] < theta_w, np.nan, dtheta_boot)
+            curves["lower"], curves["upper"] = np.nanquantile(dtheta_boot, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+    return curves
+
+
+class GroupedEvents:
+    """Events sorted by group (e.g., AI bin x woody fraction bin), with the offsets of each group, shared by all the bootstrap resamples
+
+    Args:
+        codes (np.array): group of each event, numbered 0, 1, ... without empty groups
+        is_q_gt_1 (np.array): whether q>1 for each event
+        weight (np.array): weight of each event (e.g., event length); NaN counts as 0
+    """
+
+    def __init__(self, codes, is_q_gt_1, weight):
+        codes = np.asarray(codes, dtype=np.int64)
+        order = np.argsort(codes, kind="stable")
+        self.offsets = np.zeros(codes.max(initial=-1) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(codes), out=self.offsets[1:])
+        self.sizes = np.diff(self.offsets)
+        self.is_q_gt_1 = np.asarray(is_q_gt_1, dtype=float)[order]
+        self.weight = np.nan_to_num(np.asarray(weight, dtype=float)[order])
+        self.weight_q_gt_1 = self.weight * self.is_q_gt_1
+
+        # First position and size of the group, for each position of the sorted events
+        self.start = np.repeat(self.offsets[:-1], self.sizes)
+        self.size = np.repeat(self.sizes, self.sizes)
+
+    def __len__(self):
+        return len(self.weight)
+
+
+def bootstrap_group_counts(events, n_bootstrap, seed, max_size=10_000_000):
+    """Number of q>1 events, and sums of the weights of the q>1 and all events, of each group over bootstrap resamples.
+    Each group is resampled within its own events; the resamples are drawn in batches and summed per group in one call
+
+    Returns:
+        np.array: (n_bootstrap, group, 3) counts and sums
+    """
+    rng = np.random.default_rng(seed)
+    batch_size = max(1, max_size // max(len(events), 1))
+    counts = []
+    for i_start in range(0, n_bootstrap, batch_size):
+        index = events.start + rng.integers(0, events.size, size=(min(batch_size, n_bootstrap - i_start), len(events)))
+        counts.append(
+            np.stack(
+                [
+                    np.add.reduceat(x[index], events.offsets[:-1], axis=1)
+                    for x in (events.is_q_gt_1, events.weight_q_gt_1, events.weight)
+                ],
+                axis=-1,
+            )
+        )
+    return np.concatenate(counts)
+
+
+def bootstrap_group_counts_in_pool(n_bootstrap, seed):
+    return bootstrap_group_counts(pool_groups, n_bootstrap, seed)
+
+
+def bootstrap_percentage_q(codes, is_q_gt_1, weight, n_bootstrap=1000, ci=0.9, seed=0, num_processes=1, chunk_size=100):
+    """Confidence intervals of the percentage of q>1 (and q<=1) events of all the groups, from bootstrap resamples of the events within each group
+
+    Args:
+        codes (np.array): group of each event, numbered 0, 1, ... without empty groups
+        is_q_gt_1 (np.array): whether q>1 for each event
+        weight (np.array): weight of each event, for the weighted percentages
+        n_bootstrap (int, optional): number of bootstrap resamples. Defaults to 1000.
+        ci (float, optional): coverage of the confidence intervals. Defaults to 0.9.
+        seed (int, optional): seed of the bootstrap; the resamples do not depend on num_processes. Defaults to 0.
+        num_processes (int, optional): number of worker processes, only from a script with a __main__ guard. Defaults to 1.
+        chunk_size (int, optional): number of resamples per task. Defaults to 100.
+
+    Returns:
+        pd.DataFrame: <percentage>_lower and <percentage>_upper of each group, for the (weighted_)percentage_q_gt_1 and (weighted_)percentage_q_le_1
+    """
+    events = GroupedEvents(codes, is_q_gt_1, weight)
+    i_starts = range(0, n_bootstrap, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(i_starts))
+    tasks = [(min(chunk_size, n_bootstrap - i_start), s) for i_start, s in zip(i_starts, seeds)]
+
+    if num_processes > 1:
+        with Pool(num_processes, initializer=init_pool_groups, initargs=(events,)) as pool:
+            counts = pool.starmap(bootstrap_group_counts_in_pool, tasks)
+    else:
+        counts = [bootstrap_group_counts(events, *task) for task in tasks]
+    count_q_gt_1, sum_weight_q_gt_1, sum_weight = np.moveaxis(np.concatenate(counts), -1, 0)
+
+    # Same as the point estimates of get_df_percentage_q, for each resample
+    with np.errstate(invalid="ignore", divide="ignore"):
+        count_x_weight_q_gt_1 = count_q_gt_1 * sum_weight_q_gt_1
+        count_x_weight_q_le_1 = (events.sizes - count_q_gt_1) * (sum_weight - sum_weight_q_gt_1)
+        percentages = {
+            "percentage_q_gt_1": count_q_gt_1 / events.sizes * 100,
+            "weighted_percentage_q_gt_1": count_x_weight_q_gt_1 / (count_x_weight_q_gt_1 + count_x_weight_q_le_1) * 100,
+        }
+
+    percentage_ci = pd.DataFrame(index=pd.RangeIndex(len(events.sizes)))
+    for name, percentage in percentages.items():
+        lower, upper = np.nanquantile(percentage, [(1 - ci) / 2, (1 + ci) / 2], axis=0)
+        percentage_ci[f"{name}_lower"] = lower
+        percentage_ci[f"{name}_upper"] = upper
+        percentage_ci[f"{name.replace('gt_1', 'le_1')}_lower"] = 100 - upper
+        percentage_ci[f"{name.replace('gt_1', 'le_1')}_upper"] = 100 - lower
+    return percentage_ci
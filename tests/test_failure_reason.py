@@ -0,0 +1,77 @@
+"""Failure reason codes of the model fits, pinned to the exceptions of the installed scipy"""
+
+import os
+import sys
+import numpy as np
+import pytest
+from scipy.optimize import curve_fit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from DrydownModel import FitFailure, check_fit_inputs, get_failure_reason
+
+
+def linear(x, a, b):
+    return a * x + b
+
+
+x = np.arange(5.0)
+y = 2 * x + 1
+
+
+def raised_by(**kwargs):
+    with pytest.raises(Exception) as excinfo:
+        curve_fit(linear, x, y, **kwargs)
+    return excinfo.value
+
+
+@pytest.mark.parametrize(
+    "p0, bounds, reason",
+    [
+        ([1.0, 1.0], ([0.0, 2.0], [3.0, 2.0]), "infeasible_bounds"),
+        ([5.0, 1.0], ([0.0, 0.0], [3.0, 3.0]), "infeasible_bounds"),
+    ],
+)
+def test_check_fit_inputs_bounds(p0, bounds, reason):
+    with pytest.raises(FitFailure) as excinfo:
+        check_fit_inputs(linear, x, p0, bounds)
+    assert get_failure_reason(excinfo.value) == reason
+
+
+def test_check_fit_inputs_nonfinite():
+    with pytest.raises(FitFailure) as excinfo:
+        check_fit_inputs(lambda x, a, b: np.log(a - 1) * x + b, x, [0.5, 1.0], ([0.0, 0.0], [3.0, 3.0]))
+    assert get_failure_reason(excinfo.value) == "nonfinite_residuals"
+
+
+def test_check_fit_inputs_feasible():
+    check_fit_inputs(linear, x, [1.0, 1.0], ([0.0, 0.0], [3.0, 3.0]))
+
+
+def test_index_error():
+    assert get_failure_reason(IndexError("index 0 is out of bounds")) == "insufficient_data"
+
+
+# Last-resort matching of the scipy messages, for the errors the checks do not anticipate
+def test_scipy_lower_bound_message():
+    e = raised_by(p0=[1.0, 1.0], bounds=([0.0, 2.0], [3.0, 2.0]))
+    assert get_failure_reason(e) == "infeasible_bounds"
+
+
+def test_scipy_infeasible_message():
+    e = raised_by(p0=[5.0, 1.0], bounds=([0.0, 0.0], [3.0, 3.0]))
+    assert get_failure_reason(e) == "infeasible_bounds"
+
+
+def test_scipy_not_finite_message():
+    with pytest.raises(Exception) as excinfo, np.errstate(invalid="ignore"):
+        curve_fit(lambda x, a, b: np.log(a - 1) * x + b, x, y, p0=[0.5, 1.0], bounds=([0.0, 0.0], [3.0, 3.0]))
+    assert get_failure_reason(excinfo.value) == "nonfinite_residuals"
+
+
+def test_scipy_not_converged_message():
+    e = raised_by(p0=[1.0, 1.0], bounds=([0.0, 0.0], [3.0, 3.0]), max_nfev=1)
+    assert get_failure_reason(e) == "not_converged"
+
+
+def test_other():
+    assert get_failure_reason(ZeroDivisionError()) == "other"